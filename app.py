@@ -61,7 +61,7 @@ if scenario_settings['redcap_logging']['enabled'] == True:
     try:
         # Import logger
         from loggers.redcap_logger import RedCAPLogger
-        redcap_logger = RedCAPLogger("./.secrets.toml")
+        redcap_logger = RedCAPLogger.from_toml("./.secrets.toml")
         if not redcap_logger.enabled:
             print("Warning: REDCap logger was initialized but is disabled due to errors")
     except Exception as e:
@@ -77,7 +77,7 @@ else:
 from prompts.prompt_utils import PromptLibrary
 # load default scenario settings prompt
 try:
-    prompt_library = PromptLibrary(scenario_settings['system_prompt']['prompt_id'], "./prompts/prompts.db")
+    prompt_library = PromptLibrary.for_prompt(scenario_settings['system_prompt']['prompt_id'], "./prompts/prompts.db")
     default_system_prompt = prompt_library.checkout()
     
     if not default_system_prompt:
@@ -133,7 +133,7 @@ def home():
     if prompt_id:
         try:
             # Load specific prompt if provided
-            prompt_library = PromptLibrary(prompt_id, "./prompts/prompts.db")
+            prompt_library = PromptLibrary.for_prompt(prompt_id, "./prompts/prompts.db")
             loaded_prompt = prompt_library.checkout()
             
             if loaded_prompt:
@@ -342,7 +342,7 @@ def chat():
                 message=user_message,
                 role='user'
             )
-        if scenario_settings['redcap_logging']['enabled'] == True:
+        if redcap_logger is not None and redcap_logger.is_enabled:
             redcap_logger.log_message(
                 session_id=session_id,
                 conversation_id=conversation_id,
@@ -397,7 +397,7 @@ def chat():
                 role='assistant'
             )
 
-        if scenario_settings['redcap_logging']['enabled'] == True:
+        if redcap_logger is not None and redcap_logger.is_enabled:
             redcap_logger.log_message(
                 session_id=session_id,
                 conversation_id=conversation_id,
@@ -1,24 +1,162 @@
-import toml
 import os
 import logging
+import asyncio
+import random
+import csv
+import gzip
+import io
+from urllib.parse import urlencode
 from datetime import datetime, timezone
 from redcap import Project, RedcapError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import uuid
 from typing import Optional, Dict, Any
 import time
-from functools import wraps
+import atexit
+import queue
+import threading
+from functools import lru_cache, wraps
+
+# orjson is optional - it is much faster than the stdlib for structured metadata
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:
+    import json
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, default=str, separators=(',', ':'))
+
+# Define a timeout for REDCap API calls
+REDCAP_TIMEOUT = 10  # seconds
+
+# Request bodies smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Tells the background sender to finish up and exit
+_STOP = object()
+
+@lru_cache(maxsize=8)
+def load_secrets(config_path: str) -> Dict[str, Any]:
+    """
+    Parse a TOML config file once per process
+    
+    The returned dict is shared between callers and must not be modified.
+    """
+    # Imported here so importing this module doesn't pay for a TOML parser;
+    # the stdlib tomllib (3.11+) is also much faster than the toml package
+    try:
+        import tomllib
+    except ImportError:
+        import toml
+        with open(config_path, 'r') as f:
+            return toml.load(f)
+    with open(config_path, 'rb') as f:
+        return tomllib.load(f)
+
+# Errors worth retrying - anything else is a bug or bad input and is raised immediately
+RETRIABLE_ERRORS = (RedcapError, requests.exceptions.RequestException)
+
+
+def _backoff_schedule(max_retries: int, delay: float) -> tuple:
+    """Base sleep before each retry, with None marking the final attempt"""
+    return tuple(delay * (2 ** attempt) for attempt in range(max_retries - 1)) + (None,)
+
+
+def _retry_on_failure(max_retries: int = 3, delay: float = 1.0):
+    """Decorator for retrying failed REDCap operations"""
+    schedule = _backoff_schedule(max_retries, delay)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            for attempt, wait in enumerate(schedule, 1):
+                try:
+                    return func(self, *args, **kwargs)
+                except RETRIABLE_ERRORS as e:
+                    if wait is None:
+                        self.logger.error(f"All {max_retries} attempts failed. Last error: {e}")
+                        raise
+                    # Jitter so concurrent loggers don't retry in lockstep
+                    wait *= 0.5 + random.random()
+                    self.logger.warning(f"Attempt {attempt} failed: {e}. Retrying in {wait:.2f}s...")
+                    time.sleep(wait)
+        return wrapper
+    return decorator
+
+
+def _async_retry_on_failure(max_retries: int = 3, delay: float = 1.0):
+    """Async variant of _retry_on_failure - backs off without blocking the event loop"""
+    schedule = _backoff_schedule(max_retries, delay)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            for attempt, wait in enumerate(schedule, 1):
+                try:
+                    return await func(self, *args, **kwargs)
+                except RETRIABLE_ERRORS as e:
+                    if wait is None:
+                        self.logger.error(f"All {max_retries} attempts failed. Last error: {e}")
+                        raise
+                    wait *= 0.5 + random.random()
+                    self.logger.warning(f"Attempt {attempt} failed: {e}. Retrying in {wait:.2f}s...")
+                    await asyncio.sleep(wait)
+        return wrapper
+    return decorator
+
+
+def _rows_to_csv(rows: list, fieldnames: tuple) -> str:
+    """Encode (values, metadata) rows as one flat CSV block for REDCap's import API"""
+    # Metadata fields vary per record, so append their union after the fixed columns
+    meta_columns = tuple(dict.fromkeys(key for _, meta in rows for key in meta))
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fieldnames + meta_columns)
+    if meta_columns:
+        writer.writerows(values + tuple(meta.get(key, '') for key in meta_columns)
+                         for values, meta in rows)
+    else:
+        writer.writerows(values for values, _ in rows)
+    return buf.getvalue()
+
 
 class RedCAPLogger:
-    def __init__(self, config_path: str = None):
+    logger = logging.getLogger(__name__)
+
+    # Fixed columns of every logged record, in CSV header order
+    RECORD_FIELDS = ('record_id', 'session_id', 'conversation_id', 'message',
+                     'role', 'timestamp', 'message_length')
+
+    def __init__(self, config_path: str = None, batch_size: int = 100, flush_interval: float = 1.0,
+                 compress_requests: bool = False):
         """
         Initialize REDCap logger from TOML config file or environment variables
         
         Args:
             config_path: Path to TOML configuration file (optional if using env vars)
+            batch_size: Maximum number of messages sent in one import
+            flush_interval: Longest time (seconds) a message waits for its batch to fill
+            compress_requests: Gzip large import bodies; the REDCap web server must
+                be configured to inflate gzip request bodies (e.g. mod_deflate)
         """
-        self.logger = logging.getLogger(__name__)
         self.project = None
         self.config = self._load_config(config_path)
+
+        # One keep-alive session so imports don't pay a TCP+TLS handshake each time
+        self._session = self._build_session()
+
+        # Messages are queued and coalesced by a background sender, so callers
+        # never wait on REDCap and one HTTPS round-trip carries many records
+        self._queue = queue.Queue(maxsize=10000)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._compress_requests = compress_requests
         
         # Initialize REDCap connection
         self._initialize_redcap()
@@ -27,6 +165,13 @@ class RedCAPLogger:
         if not self._test_connection():
             raise ConnectionError("Failed to establish REDCap connection")
 
+        # Project fields rarely change during a run, so fetch them once
+        self._field_names = self._fetch_field_names()
+
+        self._worker = threading.Thread(target=self._drain_queue, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
     def _load_config(self, config_path: str = None) -> Dict[str, Any]:
         """Load configuration from file or environment variables"""
         
@@ -46,11 +191,26 @@ class RedCAPLogger:
         # Fall back to TOML file
         if config_path and os.path.exists(config_path):
             self.logger.info(f"Loading REDCap config from {config_path}")
-            with open(config_path, 'r') as f:
-                return toml.load(f)
+            return load_secrets(config_path)
         
         raise ValueError("No REDCap configuration found in environment or config file")
 
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Build a pooled HTTP session for REDCap API calls"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            # Connection-level retries only; _retry_on_failure handles longer outages
+            max_retries=Retry(total=3, backoff_factor=0.3,
+                              status_forcelist=[429, 500, 502, 503, 504],
+                              allowed_methods=None)
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
     def _initialize_redcap(self):
         """Initialize REDCap project connection"""
         try:
@@ -74,33 +234,177 @@ class RedCAPLogger:
             self.logger.error(f"REDCap connection test failed: {e}")
             return False
 
-    def _retry_on_failure(max_retries: int = 3, delay: float = 1.0):
-        """Decorator for retrying failed operations"""
-        def decorator(func):
-            @wraps(func)
-            def wrapper(self, *args, **kwargs):
-                last_exception = None
-                
-                for attempt in range(max_retries):
-                    try:
-                        return func(self, *args, **kwargs)
-                    except Exception as e:
-                        last_exception = e
-                        if attempt < max_retries - 1:
-                            self.logger.warning(f"Attempt {attempt + 1} failed: {e}. Retrying in {delay}s...")
-                            time.sleep(delay * (2 ** attempt))  # Exponential backoff
-                        else:
-                            self.logger.error(f"All {max_retries} attempts failed. Last error: {e}")
-                
-                raise last_exception
-            return wrapper
-        return decorator
+    def _post_import(self, data: str) -> Dict[str, Any]:
+        """
+        POST a CSV block to the REDCap record import API over the shared session
+        
+        PyCap offers no way to hand it a requests.Session, so imports go to
+        the API directly; the Project is still used for metadata and exports.
+        """
+        body = urlencode({
+            'token': self.config['REDCAP']['API_TOKEN'],
+            'content': 'record',
+            'format': 'csv',
+            'type': 'flat',
+            'overwriteBehavior': 'normal',
+            'returnContent': 'count',
+            'returnFormat': 'json',
+            'data': data
+        }).encode()
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+        # Chat batches are repetitive text and typically shrink 5-10x
+        if self._compress_requests and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        response = self._session.post(
+            self.config['REDCAP']['API_URL'],
+            data=body,
+            headers=headers,
+            timeout=REDCAP_TIMEOUT
+        )
+        if not response.ok:
+            raise RedcapError(response.text)
+        return response.json()
+
+    def _fetch_field_names(self) -> Optional[set]:
+        """Fetch the project's field names, or None if the metadata is unavailable"""
+        try:
+            return {field['field_name'] for field in self.project.export_metadata()}
+        except Exception as e:
+            self.logger.warning(f"Could not fetch REDCap metadata: {e}")
+            return None
+
+    def test_redcap_fields(self, sample_record: Dict[str, Any]) -> bool:
+        """
+        Check that every key in a record is a field of the REDCap project
+        
+        Args:
+            sample_record: Record dict to check
+            
+        Returns:
+            bool: True if all keys are known fields, False otherwise
+        """
+        if self._field_names is None:
+            self._field_names = self._fetch_field_names()
+            if self._field_names is None:
+                return False
+
+        unknown = set(sample_record) - self._field_names
+        if unknown:
+            self.logger.warning("Fields missing from REDCap project: %s", sorted(unknown))
+        return not unknown
 
     @_retry_on_failure(max_retries=3)
+    def _import_records(self, rows: list) -> Dict[str, Any]:
+        """Send rows to REDCap as CSV, retrying transient failures"""
+        return self._post_import(_rows_to_csv(rows, self.RECORD_FIELDS))
+
+    @_async_retry_on_failure(max_retries=3)
+    async def _import_records_async(self, rows: list) -> Dict[str, Any]:
+        """Send rows to REDCap from async code without blocking the event loop"""
+        return await asyncio.to_thread(self._post_import, _rows_to_csv(rows, self.RECORD_FIELDS))
+
+    def _build_row(self, session_id: str, conversation_id: str, message: str, role: str,
+                   metadata: Optional[Dict[str, Any]] = None) -> tuple:
+        """
+        Build a REDCap row from a message and optional metadata
+
+        Returns:
+            tuple: (values in RECORD_FIELDS order, dict of meta_* fields)
+        """
+        values = (
+            uuid.uuid4().hex,  # No dashes - cheaper to build and fewer bytes on the wire
+            str(session_id),
+            str(conversation_id),
+            str(message)[:32000],  # REDCap field length limit
+            str(role).lower(),
+            # UTC with a Z suffix, e.g. 2024-01-01T12:00:00.123Z
+            datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            len(message)
+        )
+
+        meta = {}
+        if metadata:
+            # Flatten metadata and add prefix to avoid field conflicts
+            for key, value in metadata.items():
+                safe_key = f"meta_{key}"[:100]  # Ensure field name isn't too long
+                # Structured values are stored as JSON rather than their Python repr
+                if isinstance(value, (dict, list, tuple)):
+                    value = _json_dumps(value)
+                meta[safe_key] = str(value)[:1000]  # Limit value length
+
+        return values, meta
+
+    def _check_response(self, response: Dict[str, Any], expected: int = 1) -> bool:
+        """Check a REDCap import response and log the outcome"""
+        success = response.get('count', 0) >= expected
+
+        if success:
+            self.logger.debug("Successfully logged %d message(s). REDCap response: %s", expected, response)
+        else:
+            self.logger.warning("REDCap import may have failed. Response: %s", response)
+
+        return success
+
+    def _send_rows(self, rows: list) -> bool:
+        """
+        Send a batch of rows to REDCap in a single import
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.logger.debug("Sending %d message(s) to REDCap", len(rows))
+
+            # Import to REDCap (retried on transient failures)
+            return self._check_response(self._import_records(rows), expected=len(rows))
+
+        except RedcapError as e:
+            self.logger.error(f"REDCap API error: {e}")
+            return False
+        except Exception as e:
+            self.logger.error(f"Unexpected error logging to REDCap: {e}")
+            return False
+
+    def _drain_queue(self):
+        """Background thread: send queued rows once a batch fills or flush_interval passes"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            rows = [item]
+            deadline = time.monotonic() + self._flush_interval
+            while len(rows) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                rows.append(item)
+
+            self._send_rows(rows)
+            # One task_done per item taken, including the stop marker
+            for _ in range(len(rows) + stopping):
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every message queued so far has been sent"""
+        self._queue.join()
+
     def log_message(self, session_id: str, conversation_id: str, message: str, role: str, 
                    metadata: Optional[Dict[str, Any]] = None) -> bool:
         """
-        Log a message to REDCap with retry logic
+        Queue a message to be sent to REDCap in the background
         
         Args:
             session_id: Unique session identifier
@@ -110,7 +414,7 @@ class RedCAPLogger:
             metadata: Optional additional data to log
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if the message was queued (or sent), False otherwise
         """
         if not self.project:
             self.logger.error("REDCap project not initialized")
@@ -121,41 +425,39 @@ class RedCAPLogger:
             self.logger.error("Missing required parameters for logging")
             return False
 
-        # Prepare record data
-        record_data = {
-            'record_id': str(uuid.uuid4()),
-            'session_id': str(session_id),
-            'conversation_id': str(conversation_id),
-            'message': str(message)[:32000],  # REDCap field length limit
-            'role': str(role).lower(),
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'message_length': len(message)
-        }
+        row = self._build_row(session_id, conversation_id, message, role, metadata)
 
-        # Add metadata if provided
-        if metadata:
-            # Flatten metadata and add prefix to avoid field conflicts
-            for key, value in metadata.items():
-                safe_key = f"meta_{key}"[:100]  # Ensure field name isn't too long
-                record_data[safe_key] = str(value)[:1000]  # Limit value length
+        self.logger.debug("Queueing message for REDCap: session=%s, conv=%s, role=%s",
+                          session_id, conversation_id, role)
 
         try:
-            # Log the attempt
-            self.logger.debug(f"Logging message to REDCap: session={session_id}, conv={conversation_id}, role={role}")
-            
-            # Import to REDCap
-            response = self.project.import_records([record_data])
-            
-            # Check response
-            success = response.get('count', 0) > 0
-            
-            if success:
-                self.logger.debug(f"Successfully logged message. REDCap response: {response}")
-            else:
-                self.logger.warning(f"REDCap import may have failed. Response: {response}")
-                
-            return success
-            
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            # Sender has fallen far behind - send inline rather than drop the message
+            self.logger.warning("REDCap queue full, sending message synchronously")
+            return self._send_rows([row])
+
+    async def alog_message(self, session_id: str, conversation_id: str, message: str, role: str,
+                           metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Async version of log_message for callers running in an event loop
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.project:
+            self.logger.error("REDCap project not initialized")
+            return False
+
+        if not all([session_id, conversation_id, message, role]):
+            self.logger.error("Missing required parameters for logging")
+            return False
+
+        row = self._build_row(session_id, conversation_id, message, role, metadata)
+
+        try:
+            return self._check_response(await self._import_records_async([row]))
         except RedcapError as e:
             self.logger.error(f"REDCap API error: {e}")
             return False
@@ -253,6 +555,13 @@ class RedCAPLogger:
             self.logger.error(f"Error retrieving session logs: {e}")
             return None
 
+    def close(self):
+        """Send any queued messages, stop the sender thread and release the HTTP session"""
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._worker.join(timeout=REDCAP_TIMEOUT * 3)
+        self._session.close()
+
     def health_check(self) -> Dict[str, Any]:
         """
         Perform health check on REDCap connection
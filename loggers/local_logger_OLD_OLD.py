@@ -1,13 +1,42 @@
 import duckdb
+import pyarrow as pa
 import os
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
+# Log records go through a queue and are written by a listener thread, so
+# callers never block on the stdout lock during migrations or exports
+logger = logging.getLogger(__name__)
+_log_queue: queue.Queue = queue.Queue(-1)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 class ChatLogger:
-    def __init__(self, db_path: str = "chat_logs.db"):
+    # Buffer columns, in chat_messages table order - the insert matches by position
+    _COLUMNS = ('session_id', 'conversation_id', 'message', 'role', 'created_at')
+    
+    def __init__(self, db_path: str = "chat_logs.db", buffer_limit: int = 1000):
         self.db_path = db_path
         self.conn = duckdb.connect(db_path)
+        # Each thread gets its own cursor on the shared connection so concurrent
+        # callers don't contend on one statement/transaction state
+        self._local = threading.local()
+        self._buffer_lock = threading.Lock()
+        # Messages are buffered column-wise and written in bulk - one INSERT per row is
+        # very slow in DuckDB, and a column per list maps straight onto an Arrow table
+        self._buffer: Dict[str, list] = {name: [] for name in self._COLUMNS}
+        self._buffer_limit = buffer_limit
         self._initialize_db()
+        atexit.register(self._flush)
     
     def _initialize_db(self):
         """Initialize database with migrations table and run any pending migrations"""
@@ -39,9 +68,25 @@ class ChatLogger:
                     )
                 """
             },
+            {
+                'id': 2,
+                'name': 'index_conversation_created_at',
+                'sql': """
+                    CREATE INDEX IF NOT EXISTS ix_msg_conv_time
+                    ON chat_messages (conversation_id, created_at)
+                """
+            },
+            {
+                'id': 3,
+                'name': 'index_session_created_at',
+                'sql': """
+                    CREATE INDEX IF NOT EXISTS ix_msg_session_time
+                    ON chat_messages (session_id, created_at)
+                """
+            },
             # Add future migrations here
             # {
-            #     'id': 2,
+            #     'id': 4,
             #     'name': 'add_token_count',
             #     'sql': 'ALTER TABLE chat_messages ADD COLUMN token_count INTEGER'
             # },
@@ -49,12 +94,12 @@ class ChatLogger:
         
         for migration in migrations:
             if not self._migration_applied(migration['id']):
-                print(f"Running migration: {migration['name']}")
+                logger.info("Running migration: %s", migration['name'])
                 self.conn.execute(migration['sql'])
                 self.conn.execute("""
                     INSERT INTO _migrations (id, name) VALUES (?, ?)
                 """, [migration['id'], migration['name']])
-                print(f"Migration {migration['name']} completed")
+                logger.info("Migration %s completed", migration['name'])
     
     def _migration_applied(self, migration_id: int) -> bool:
         """Check if a migration has already been applied"""
@@ -63,53 +108,121 @@ class ChatLogger:
         """, [migration_id]).fetchone()
         return result[0] > 0
     
+    def _cur(self) -> duckdb.DuckDBPyConnection:
+        """Return this thread's cursor, creating it on first use"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self.conn.cursor()
+            self._local.cursor = cursor
+        return cursor
+    
+    def _flush(self):
+        """Write all buffered messages to the database in one bulk insert"""
+        with self._buffer_lock:
+            if not self._buffer['session_id']:
+                return
+            columns = self._buffer
+            self._buffer = {name: [] for name in self._COLUMNS}
+        try:
+            # The buffer is already column lists, so they become an Arrow table
+            # as they are; one insert is one statement, committed or failed whole
+            self._cur().from_arrow(pa.table(columns)).insert_into('chat_messages')
+        except Exception:
+            # Keep the rows so the next flush can retry them
+            with self._buffer_lock:
+                for name in self._COLUMNS:
+                    self._buffer[name][:0] = columns[name]
+            raise
+    
+    def _append_rows(self, rows: List[tuple]):
+        """Add rows to the buffer, flushing once it reaches the limit"""
+        with self._buffer_lock:
+            for name, values in zip(self._COLUMNS, zip(*rows)):
+                self._buffer[name].extend(values)
+            full = len(self._buffer['session_id']) >= self._buffer_limit
+        if full:
+            self._flush()
+    
     def log_message(self, session_id: str, conversation_id: str, message: str, role: str):
-        """Log a single message"""
-        self.conn.execute("""
-            INSERT INTO chat_messages (session_id, conversation_id, message, role)
-            VALUES (?, ?, ?, ?)
-        """, [session_id, conversation_id, message, role])
+        """Log a single message (buffered until the next flush)"""
+        # Timestamp now, not at flush time, so ordering reflects when messages were logged
+        self._append_rows([(session_id, conversation_id, message, role, datetime.now())])
     
     def log_conversation_turn(self, session_id: str, conversation_id: str, 
                             user_message: str, assistant_message: str):
         """Log both user and assistant messages in one call"""
-        self.log_message(session_id, conversation_id, user_message, "user")
-        self.log_message(session_id, conversation_id, assistant_message, "assistant")
+        # Separate timestamps keep the user message ordered before the reply
+        self._append_rows([
+            (session_id, conversation_id, user_message, "user", datetime.now()),
+            (session_id, conversation_id, assistant_message, "assistant", datetime.now()),
+        ])
+    
+    def _fetch_dicts(self, query: str, params: list) -> List[Dict[str, Any]]:
+        """Run a query and return rows as dicts, without a pandas round-trip"""
+        cursor = self._cur().execute(query, params)
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     def get_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a conversation"""
-        return self.conn.execute("""
+        self._flush()
+        return self._fetch_dicts("""
             SELECT session_id, conversation_id, message, role, created_at
             FROM chat_messages 
             WHERE conversation_id = ?
             ORDER BY created_at
-        """, [conversation_id]).fetchdf().to_dict('records')
+        """, [conversation_id])
     
     def get_session_conversations(self, session_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a session"""
-        return self.conn.execute("""
+        self._flush()
+        return self._fetch_dicts("""
             SELECT session_id, conversation_id, message, role, created_at
             FROM chat_messages 
             WHERE session_id = ?
             ORDER BY created_at
-        """, [session_id]).fetchdf().to_dict('records')
+        """, [session_id])
     
-    def export_to_csv(self, output_path: str, where_clause: str = ""):
-        """Export messages to CSV with optional filtering"""
+    def export(self, output_path: str, where_sql: str = "", where_params: Optional[list] = None,
+               fmt: str = "parquet"):
+        """
+        Export messages to Parquet or CSV with optional filtering
+        
+        Args:
+            output_path: File to write
+            where_sql: Optional filter using ? placeholders, e.g. "created_at > ?"
+            where_params: Values bound to the placeholders in where_sql
+            fmt: "parquet" (compressed, columnar) or "csv"
+        """
+        if fmt == "parquet":
+            options = "FORMAT PARQUET, COMPRESSION ZSTD"
+        elif fmt == "csv":
+            options = "HEADER, DELIMITER ','"
+        else:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        
+        self._flush()
+        # COPY needs the path as a literal, so escape it rather than interpolating raw
+        escaped_path = output_path.replace("'", "''")
         query = f"""
             COPY (
                 SELECT session_id, conversation_id, message, role, created_at
                 FROM chat_messages
-                {f'WHERE {where_clause}' if where_clause else ''}
+                {f'WHERE {where_sql}' if where_sql else ''}
                 ORDER BY created_at
-            ) TO '{output_path}' (HEADER, DELIMITER ',')
+            ) TO '{escaped_path}' ({options})
         """
-        self.conn.execute(query)
-        print(f"Exported to {output_path}")
+        self._cur().execute(query, where_params or [])
+        logger.info("Exported to %s", output_path)
+    
+    def export_to_csv(self, output_path: str, where_clause: str = "", where_params: Optional[list] = None):
+        """Export messages to CSV with optional filtering"""
+        self.export(output_path, where_clause, where_params, fmt="csv")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get basic statistics about logged conversations"""
-        stats = self.conn.execute("""
+        self._flush()
+        stats = self._cur().execute("""
             SELECT 
                 COUNT(*) as total_messages,
                 COUNT(DISTINCT session_id) as unique_sessions,
@@ -128,23 +241,25 @@ class ChatLogger:
         }
     
     def close(self):
-        """Close database connection"""
+        """Flush buffered messages and close database connection"""
+        self._flush()
+        atexit.unregister(self._flush)
         self.conn.close()
 
 # Example usage
 if __name__ == "__main__":
     # Initialize logger
-    logger = ChatLogger("chat_logs.db")
+    chat_logger = ChatLogger("chat_logs.db")
     
     # Log some example conversations
-    logger.log_conversation_turn(
+    chat_logger.log_conversation_turn(
         session_id="session_001",
         conversation_id="conv_001", 
         user_message="Hello, how are you?",
         assistant_message="I'm doing well, thank you! How can I help you today?"
     )
     
-    logger.log_conversation_turn(
+    chat_logger.log_conversation_turn(
         session_id="session_001",
         conversation_id="conv_001",
         user_message="Can you explain Python decorators?",
@@ -152,17 +267,20 @@ if __name__ == "__main__":
     )
     
     # Get conversation
-    conv = logger.get_conversation("conv_001")
+    conv = chat_logger.get_conversation("conv_001")
     print("Conversation:", conv)
     
     # Get stats
-    stats = logger.get_stats()
+    stats = chat_logger.get_stats()
     print("Stats:", stats)
     
     # Export to CSV
-    logger.export_to_csv("chat_export.csv")
+    chat_logger.export_to_csv("chat_export.csv")
     
     # Export with filtering
-    logger.export_to_csv("recent_chats.csv", "created_at > '2024-01-01'")
+    chat_logger.export_to_csv("recent_chats.csv", "created_at > ?", ['2024-01-01'])
+    
+    # Export to Parquet for re-ingest with read_parquet()
+    chat_logger.export("chat_export.parquet")
     
-    logger.close()
\ No newline at end of file
+    chat_logger.close()
\ No newline at end of file
@@ -1,30 +1,140 @@
-import toml
-import threading
+import atexit
+import importlib.util
+import multiprocessing
 import queue
+import random
+import threading
+from collections import deque
 import time
-from datetime import datetime
+from time import monotonic
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, Any, Optional
 import uuid
+import requests
 import requests.exceptions
+from requests.adapters import HTTPAdapter
+
+# orjson is optional - batches are mostly message text, which it encodes in C
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':'))
 
 # Define a timeout for REDCap API calls
 REDCAP_TIMEOUT = 5  # seconds
 
+# Default batching: send at 50 messages or 2 seconds after the first, whichever comes first
+MAX_BATCH = 50
+MAX_WAIT = 2.0  # seconds
+
+
+def _subprocess_worker(mp_queue, config_path: str, options: Dict[str, Any]):
+    """
+    Child-process entry point for RedCAPLogger(use_subprocess=True)
+    
+    Runs an ordinary threaded logger in this process and feeds it the messages
+    the parent puts on mp_queue, until the parent sends None.
+    """
+    redcap_logger = RedCAPLogger(config_path, **options)
+    while True:
+        item = mp_queue.get()
+        if item is None:
+            break
+        if redcap_logger.is_enabled:
+            redcap_logger._enqueue(item)
+    
+    # A worker pops its batch before posting it, so empty shards don't mean
+    # everything was sent - wait (bounded) for the workers themselves to finish
+    redcap_logger.close(timeout=REDCAP_TIMEOUT * 3)
+
+
+@lru_cache(maxsize=8)
+def load_secrets(config_path: str) -> Dict[str, Any]:
+    """
+    Parse a TOML secrets file once per process
+    
+    The returned dict is shared between callers and must not be modified.
+    """
+    # Imported here so importing this module doesn't pay for a TOML parser;
+    # the stdlib tomllib (3.11+) is also much faster than the toml package
+    try:
+        import tomllib
+    except ImportError:
+        import toml
+        with open(config_path, 'r') as f:
+            return toml.load(f)
+    with open(config_path, 'rb') as f:
+        return tomllib.load(f)
+
+
 class RedCAPLogger:
-    def __init__(self, config_path: str):
+    _instances: Dict[str, 'RedCAPLogger'] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def from_toml(cls, config_path: str) -> 'RedCAPLogger':
+        """
+        Get the process-wide logger for a secrets file, creating it on first use
+        
+        Repeated construction would otherwise start another worker thread and
+        another REDCap Project for the same credentials.
+        """
+        with cls._instances_lock:
+            if config_path not in cls._instances:
+                cls._instances[config_path] = cls(config_path)
+            return cls._instances[config_path]
+
+    def __init__(self, config_path: str, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT,
+                 max_queue: int = 10000, coalesce: bool = False, workers: int = 2,
+                 max_attempts: int = 5, dead_letter_path: str = "redcap_dead_letter.jsonl",
+                 use_subprocess: bool = False):
         """
         Initialize REDCap logger from TOML config file with background processing
         
         Args:
             config_path: Path to TOML configuration file
+            max_batch: Send a batch as soon as it holds this many messages
+            max_wait: Send a partial batch once this many seconds have passed
+                      since its first message arrived
+            max_queue: Most messages each worker holds while REDCap is slow or
+                       down; beyond this the oldest are dropped and counted in
+                       self.dropped
+            coalesce: Send all messages of a conversation in a batch as one record
+                      with a messages_json field (needs that field in the instrument)
+            workers: Number of upload threads; each owns a queue shard and an
+                     HTTP session, and a session always maps to the same shard
+            max_attempts: Failed sends per record before it is given up on
+            dead_letter_path: JSON-lines file that records are appended to once
+                              they have failed max_attempts times
+            use_subprocess: Run PyCap, HTTP and serialization in a spawned child
+                            process, off this interpreter's GIL. The main script
+                            must then be import-safe (guarded by __main__), and
+                            dropped/error are only tracked in the child
         """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.dropped = 0
+        # += on an attribute isn't atomic, and callers and workers all count drops
+        self._dropped_lock = threading.Lock()
+        self.coalesce = coalesce
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self._dead_letter_lock = threading.Lock()
+        self._process = None
+        self.worker_threads = []
         self.initialized = False
         self.enabled = True
         self.error = None
         
         try:
-            with open(config_path, 'r') as f:
-                secrets = toml.load(f)
+            secrets = load_secrets(config_path)
             
             if 'REDCAP' not in secrets:
                 self.error = "No REDCAP section in secrets file"
@@ -32,6 +142,22 @@ class RedCAPLogger:
                 print(f"REDCap logging disabled: {self.error}")
                 return
                 
+            if use_subprocess:
+                # Only check PyCap is there - the child process does the import
+                if importlib.util.find_spec('redcap') is None:
+                    self.error = "PyCap not installed"
+                    self.enabled = False
+                    print(f"REDCap logging disabled: {self.error}")
+                    return
+                self._start_subprocess(config_path, {
+                    'max_batch': max_batch, 'max_wait': max_wait, 'max_queue': max_queue,
+                    'coalesce': coalesce, 'workers': workers, 'max_attempts': max_attempts,
+                    'dead_letter_path': dead_letter_path
+                })
+                self.initialized = True
+                print("REDCap logger initialized successfully (subprocess)")
+                return
+            
             # Import REDCap here to avoid issues if it's not installed
             try:
                 from redcap import Project
@@ -48,12 +174,10 @@ class RedCAPLogger:
             
             # Initialize project to None - will connect on first use
             self.project = None
+            self._connect_lock = threading.Lock()
             
-            # Initialize message queue and worker thread
-            self.message_queue = queue.Queue()
-            self.worker_thread = threading.Thread(target=self._process_queue)
-            self.worker_thread.daemon = True  # Allow thread to be terminated when program exits
-            self.worker_thread.start()
+            # Threads are only started once everything above has succeeded
+            self._start_workers(workers, max_queue)
             
             self.initialized = True
             print("REDCap logger initialized successfully")
@@ -62,7 +186,91 @@ class RedCAPLogger:
             self.error = str(e)
             self.enabled = False
             print(f"Error initializing REDCap logger: {self.error}")
+        finally:
+            # Disabled loggers never re-enable, so bind a no-op and skip the
+            # enabled check on every call from the request thread
+            if not self.enabled:
+                self.log_message = lambda *args, **kwargs: False
+    
+    @property
+    def is_enabled(self) -> bool:
+        """True if messages will actually be sent - lets callers skip building them"""
+        return self.enabled and self.initialized
+
+    def _start_workers(self, workers: int, max_queue: int):
+        """Create the queue shards and start one upload thread per shard"""
+        # One queue shard, wakeup event and keep-alive session per worker, so
+        # batches upload in parallel while only the first POST on each
+        # session pays for the TCP and TLS handshake. deque append/popleft are
+        # atomic, so log_message only pays for an append and an Event.set()
+        self.shards = [deque(maxlen=max_queue) for _ in range(workers)]
+        self._wakes = [threading.Event() for _ in range(workers)]
+        self._sessions = [self._build_session() for _ in range(workers)]
+        self._stop = threading.Event()
+        for shard_idx in range(workers):
+            worker = threading.Thread(target=self._process_queue, args=(shard_idx,))
+            worker.daemon = True  # Allow thread to be terminated when program exits
+            worker.start()
+            self.worker_threads.append(worker)
+    
+    def close(self, timeout: float = REDCAP_TIMEOUT):
+        """
+        Stop the workers once they have sent what is queued
+        
+        Args:
+            timeout: Longest wait for each worker (or the child process) to finish
+        """
+        if self._process is not None:
+            atexit.unregister(self._stop_subprocess)
+            self._stop_subprocess()
+            return
+        if not self.worker_threads:
+            return
+        self._stop.set()
+        for wake in self._wakes:
+            wake.set()
+        for worker in self.worker_threads:
+            worker.join(timeout)
     
+    def _start_subprocess(self, config_path: str, options: Dict[str, Any]):
+        """Start the child process that does the REDCap work for this logger"""
+        ctx = multiprocessing.get_context('spawn')
+        self._mp_queue = ctx.Queue(maxsize=options['max_queue'])
+        self._process = ctx.Process(target=_subprocess_worker,
+                                    args=(self._mp_queue, config_path, options), daemon=True)
+        self._process.start()
+        self.log_message = self._log_to_subprocess
+        atexit.register(self._stop_subprocess)
+    
+    def _stop_subprocess(self):
+        """Ask the child process to send what it has queued and exit"""
+        try:
+            self._mp_queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._process.join(timeout=REDCAP_TIMEOUT * 3 + 1)
+    
+    def _log_to_subprocess(self, session_id: str, conversation_id: str, message: str, role: str) -> bool:
+        """log_message for use_subprocess mode - hands the message to the child process"""
+        try:
+            self._mp_queue.put_nowait((session_id, conversation_id, message, role, time.time()))
+            return True
+        except queue.Full:
+            # A process queue can't drop its oldest entry, so the newest is dropped
+            self._count_dropped(1)
+            return False
+        except Exception as e:
+            print(f"Error queueing REDCap message: {str(e)}")
+            return False
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Build a keep-alive HTTP session for one upload worker"""
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
     def _connect(self) -> bool:
         """Establish connection to REDCap project"""
         if self.project is not None:
@@ -70,14 +278,40 @@ class RedCAPLogger:
             
         if not self.enabled:
             return False
-            
-        try:
-            self.project = self.Project(self.api_url, self.api_token, timeout=REDCAP_TIMEOUT)
-            return True
-        except Exception as e:
-            self.error = f"Connection error: {str(e)}"
-            print(f"REDCap connection error: {self.error}")
-            return False
+        
+        # Workers start together - only one of them should build the Project
+        with self._connect_lock:
+            if self.project is not None:
+                return True
+            try:
+                self.project = self.Project(self.api_url, self.api_token, timeout=REDCAP_TIMEOUT)
+                # Connected for good - later calls no longer need the checks or lock
+                self._connect = lambda: True
+                return True
+            except Exception as e:
+                self.error = f"Connection error: {str(e)}"
+                print(f"REDCap connection error: {self.error}")
+                return False
+    
+    def _post_records(self, records: list, session: requests.Session) -> Dict[str, Any]:
+        """
+        POST records to the REDCap import API over a worker's persistent session
+        
+        PyCap has no supported way to take a requests.Session, so batches go
+        to the API directly; the Project is still used to validate the token.
+        """
+        response = session.post(self.api_url, data={
+            'token': self.api_token,
+            'content': 'record',
+            'format': 'json',
+            'type': 'flat',
+            'overwriteBehavior': 'normal',
+            'returnContent': 'count',
+            'returnFormat': 'json',
+            'data': _json_dumps(records)
+        }, timeout=REDCAP_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
     
     def log_message(self, session_id: str, conversation_id: str, message: str, role: str) -> bool:
         """
@@ -96,63 +330,187 @@ class RedCAPLogger:
             return False
             
         try:
-            record_data = {
-                'record_id': str(uuid.uuid4()),
-                'session_id': session_id,
-                'conversation_id': conversation_id,
-                'message': message,
-                'role': role,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Add to queue and return immediately
-            self.message_queue.put(record_data)
+            # Only capture the message here - the record id and timestamp string
+            # are built on the worker thread, off the caller's request path
+            self._enqueue((session_id, conversation_id, message, role, time.time()))
             return True
         except Exception as e:
             print(f"Error queueing REDCap message: {str(e)}")
             return False
     
-    def _process_queue(self):
-        """Background thread to process queued messages"""
+    def _count_dropped(self, count: int):
+        """Add to self.dropped from any thread"""
+        with self._dropped_lock:
+            self.dropped += count
+    
+    def _enqueue(self, item: tuple):
+        """Put a (session_id, conversation_id, message, role, time) item on its shard"""
+        # Sharding by session keeps each session's messages in order
+        shard_idx = hash(item[0]) % len(self.shards)
+        shard = self.shards[shard_idx]
+        # A full deque drops its oldest entry on append
+        if len(shard) == shard.maxlen:
+            self._count_dropped(1)
+        shard.append(item)
+        self._wakes[shard_idx].set()
+    
+    @staticmethod
+    def _to_record(item) -> Dict[str, Any]:
+        """Build the REDCap record for a queued message; requeued records pass through"""
+        if isinstance(item, dict):
+            return item
+        session_id, conversation_id, message, role, logged_at = item
+        return {
+            'record_id': uuid.uuid4().hex,
+            'session_id': session_id,
+            'conversation_id': conversation_id,
+            'message': message,
+            'role': role,
+            # UTC with a Z suffix, e.g. 2024-01-01T12:00:00.123Z
+            'timestamp': datetime.fromtimestamp(logged_at, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        }
+    
+    @staticmethod
+    def _coalesce(records: list) -> list:
+        """
+        Merge records of the same session and conversation into one record
+        
+        Groups keep first-seen order and messages keep arrival order inside
+        messages_json. Records that are already coalesced pass through.
+        """
+        groups: Dict[Any, list] = {}
+        for record in records:
+            if 'messages_json' in record:
+                key = record['record_id']
+            else:
+                key = (record['session_id'], record['conversation_id'])
+            groups.setdefault(key, []).append(record)
+        
+        merged = []
+        for group in groups.values():
+            first = group[0]
+            if 'messages_json' in first:
+                merged.append(first)
+                continue
+            merged.append({
+                'record_id': first['record_id'],
+                'session_id': first['session_id'],
+                'conversation_id': first['conversation_id'],
+                'timestamp': first['timestamp'],
+                'messages_json': _json_dumps([
+                    {'role': r['role'], 'message': r['message'], 'timestamp': r['timestamp']}
+                    for r in group
+                ])
+            })
+        return merged
+    
+    def _dead_letter(self, records: list):
+        """Append records that could not be delivered to the dead-letter file"""
+        try:
+            with self._dead_letter_lock, open(self.dead_letter_path, 'a') as f:
+                f.write(''.join(_json_dumps(record) + '\n' for record in records))
+            print(f"REDCap gave up on {len(records)} messages - written to {self.dead_letter_path}")
+        except Exception as e:
+            print(f"Error writing REDCap dead letters: {str(e)}")
+    
+    def _process_queue(self, shard_idx: int):
+        """Background thread to process the messages queued on one shard"""
+        shard = self.shards[shard_idx]
+        wake = self._wakes[shard_idx]
+        session = self._sessions[shard_idx]
+        # Bound once - these are read on every pass of the loop
+        max_batch = self.max_batch
+        max_wait = self.max_wait
+        stop = self._stop
+        
+        # Connect while idle at startup rather than in front of the first batch;
+        # until REDCap is reachable, messages wait in the shard
+        retry_delay = 1.0
+        while not self._connect():
+            if stop.wait(retry_delay):
+                return
+            retry_delay = min(retry_delay * 2, 60.0)
+        
+        # Failed sends per record_id, and when this worker may send again
+        attempts: Dict[str, int] = {}
+        backoff_until = 0.0
         while True:
             try:
-                # Get a batch of messages (up to 10) or wait for new ones
-                batch = []
-                try:
-                    # Get first message or wait
-                    batch.append(self.message_queue.get(block=True, timeout=1))
-                    
-                    # Get any additional messages without waiting
-                    for _ in range(9):  # Up to 9 more (10 total)
-                        if not self.message_queue.empty():
-                            batch.append(self.message_queue.get(block=False))
-                        else:
-                            break
-                except queue.Empty:
-                    # No messages in queue, just continue the loop
+                # Back off after a failure instead of hammering a struggling server
+                delay = backoff_until - monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                
+                # Clear before checking, so a message appended in between
+                # still leaves the event set and wakes the wait below
+                wake.clear()
+                if not shard:
+                    if stop.is_set():
+                        return
+                    wake.wait(timeout=1)
                     continue
                 
+                # Keep filling until the batch is full or max_wait has passed,
+                # so bursts go out as a few large POSTs instead of many small ones
+                deadline = monotonic() + max_wait
+                while len(shard) < max_batch and not stop.is_set():
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    wake.clear()
+                    if len(shard) >= max_batch:
+                        break
+                    wake.wait(timeout=remaining)
+                
+                batch = []
+                while shard and len(batch) < max_batch:
+                    batch.append(shard.popleft())
+                
                 # Process the batch
-                if batch and self._connect():
+                if batch:
+                    # Requeued records keep their ids, so a retry overwrites rather than duplicates
+                    batch = [self._to_record(item) for item in batch]
+                    if self.coalesce:
+                        batch = self._coalesce(batch)
                     try:
-                        response = self.project.import_records(batch, timeout=REDCAP_TIMEOUT)
+                        response = self._post_records(batch, session)
+                        for record in batch:
+                            attempts.pop(record['record_id'], None)
                         success_count = response.get('count', 0)
                         if success_count != len(batch):
                             print(f"Warning: REDCap logged {success_count}/{len(batch)} messages")
-                    except requests.exceptions.Timeout:
-                        print("REDCap API timeout - will retry messages later")
-                        # Put messages back in queue
-                        for record in batch:
-                            self.message_queue.put(record)
                     except Exception as e:
-                        print(f"Error sending batch to REDCap: {str(e)}")
-                
-                # Mark tasks as done
-                for _ in batch:
-                    self.message_queue.task_done()
-                    
-                # Small delay to prevent CPU spinning
-                time.sleep(0.1)
+                        # Every failure counts against the records' attempts, so a
+                        # failed batch is retried and then dead-lettered, not discarded
+                        if isinstance(e, requests.exceptions.Timeout):
+                            print("REDCap API timeout - will retry messages later")
+                        else:
+                            print(f"Error sending batch to REDCap: {str(e)} - will retry messages later")
+                        retry, dead = [], []
+                        for record in batch:
+                            count = attempts.get(record['record_id'], 0) + 1
+                            if count >= self.max_attempts:
+                                attempts.pop(record['record_id'], None)
+                                dead.append(record)
+                            else:
+                                attempts[record['record_id']] = count
+                                retry.append(record)
+                        if dead:
+                            self._dead_letter(dead)
+                        batch = retry
+                        worst = max((attempts[record['record_id']] for record in batch), default=0)
+                        # Jittered, so workers that failed together don't retry in lockstep
+                        delay = min(30, 2 ** worst)
+                        backoff_until = monotonic() + delay / 2 + random.uniform(0, delay / 2)
+                        # Put messages back at the front so they keep their order,
+                        # dropping the oldest of them if the queue has since filled
+                        room = shard.maxlen - len(shard)
+                        if room < len(batch):
+                            self._count_dropped(len(batch) - max(room, 0))
+                            for record in batch[:len(batch) - max(room, 0)]:
+                                attempts.pop(record['record_id'], None)
+                            batch = batch[len(batch) - max(room, 0):]
+                        shard.extendleft(reversed(batch))
                 
             except Exception as e:
                 print(f"Error in REDCap worker thread: {str(e)}")
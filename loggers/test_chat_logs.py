@@ -5,6 +5,34 @@ import duckdb
 from datetime import datetime
 import time
 
+# Most recent messages; LIMIT is bound as a parameter rather than formatted in
+_RECENT_QUERY = """
+    SELECT 
+        session_id, 
+        conversation_id, 
+        substr(message, 1, 100) || CASE WHEN length(message) > 100 THEN '...' ELSE '' END as message_preview,
+        role, 
+        created_at
+    FROM chat_messages
+    ORDER BY created_at DESC
+    LIMIT ?
+"""
+
+def _connect(db_path):
+    """
+    Open a read-only connection for one dump
+    
+    Not kept open between calls: a held connection would block the chat
+    logger from opening the file for writing, and would go on serving a
+    stale view if the file were replaced.
+    """
+    try:
+        # Try with access_mode first (newer DuckDB versions)
+        return duckdb.connect(db_path, config={'access_mode': 'READ_ONLY'})
+    except TypeError:
+        # Fall back to read_only parameter (older DuckDB versions)
+        return duckdb.connect(db_path, read_only=True)
+
 def dump_recent_chat_logs(db_path, limit=10, retries=3):
     """
     Dump the most recent chat log entries from DuckDB
@@ -20,16 +48,8 @@ def dump_recent_chat_logs(db_path, limit=10, retries=3):
     
     for attempt in range(retries):
         try:
-            # Connect in read-only mode with explicit config
-            config = {'access_mode': 'READ_ONLY'}
-            try:
-                # Try with access_mode first (newer DuckDB versions)
-                with duckdb.connect(db_path, config=config) as conn:
-                    return _perform_query(conn, db_path, limit)
-            except TypeError:
-                # Fall back to read_only parameter (older DuckDB versions)
-                with duckdb.connect(db_path, read_only=True) as conn:
-                    return _perform_query(conn, db_path, limit)
+            with _connect(db_path) as conn:
+                return _perform_query(conn, db_path, limit)
                 
         except duckdb.duckdb.IOException as e:
             if "Conflicting lock is held" in str(e):
@@ -45,46 +65,45 @@ def dump_recent_chat_logs(db_path, limit=10, retries=3):
             print(f"Error querying database: {e}")
             return False
 
+# Bound once instead of re-parsing the format string for every row
+_ROW_FMT = "{:<10} | {:<10} | {:<15} | {:<40} | {:<20}\n".format
+
+def _shape_row(row):
+    """Truncate ids and flatten the preview for one result row"""
+    session_id, conv_id, message, role, timestamp = row
+    if len(session_id) > 10:
+        session_id = session_id[:8] + "..."
+    if len(conv_id) > 10:
+        conv_id = conv_id[:8] + "..."
+    # str() the timestamp - a datetime would treat the width spec as strftime
+    return session_id, conv_id, role, message.replace("\n", " "), str(timestamp)
+
 def _perform_query(conn, db_path, limit):
     """Execute the query and display results"""
-    # Query for the most recent messages
-    result = conn.execute(f"""
-        SELECT 
-            session_id, 
-            conversation_id, 
-            substr(message, 1, 100) || CASE WHEN length(message) > 100 THEN '...' ELSE '' END as message_preview,
-            role, 
-            created_at
-        FROM chat_messages
-        ORDER BY created_at DESC
-        LIMIT {limit}
-    """).fetchall()
+    # Query for the most recent messages, streamed in chunks rather than
+    # materialized all at once
+    cursor = conn.execute(_RECENT_QUERY, [limit])
+    rows = cursor.fetchmany(256)
     
-    if not result:
+    if not rows:
         print("No chat messages found in the database.")
         return True
     
     # Print header
     print("\n{:-^80}".format(" Recent Chat Messages "))
-    print("{:<10} | {:<10} | {:<15} | {:<40} | {:<20}".format(
-        "Session", "Conv. ID", "Role", "Message Preview", "Timestamp"
-    ))
+    sys.stdout.write(_ROW_FMT("Session", "Conv. ID", "Role", "Message Preview", "Timestamp"))
     print("-" * 80)
     
     # Print messages (newest first)
-    for row in result:
-        session_id = row[0][:8] + "..." if len(row[0]) > 10 else row[0]
-        conv_id = row[1][:8] + "..." if len(row[1]) > 10 else row[1]
-        message = row[2].replace("\n", " ")
-        role = row[3]
-        timestamp = row[4]
-        
-        print("{:<10} | {:<10} | {:<15} | {:<40} | {:<20}".format(
-            session_id, conv_id, role, message, timestamp
-        ))
+    count = 0
+    while rows:
+        # One write per chunk rather than one print per row
+        sys.stdout.write(''.join([_ROW_FMT(*_shape_row(row)) for row in rows]))
+        count += len(rows)
+        rows = cursor.fetchmany(256)
     
     print("-" * 80)
-    print(f"Showing {len(result)} most recent messages from {db_path}")
+    print(f"Showing {count} most recent messages from {db_path}")
     return True
 
 if __name__ == "__main__":
@@ -1,16 +1,58 @@
 import streamlit as st
 import duckdb
+import json
 import uuid
 import pandas as pd
+import pyarrow as pa
 from pathlib import Path
+import re
+import threading
 import time
+from collections import deque
 
 # Database setup
 DB_PATH = "prompts.db"
 
-def init_database():
+# Single-row statements on the hot paths, defined once and bound with parameters
+INSERT_PROMPT_SQL = """
+    INSERT INTO prompts (uuid, title, content, description, version, forked_from)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+UPDATE_PROMPT_SQL = """
+    UPDATE prompts 
+    SET title = ?, content = ?, description = ?, updated_at = CURRENT_TIMESTAMP,
+        version = version + 1
+    WHERE uuid = ?
+"""
+# Explicit columns so callers read fields by name, not by table position
+PROMPT_COLUMNS = ('uuid', 'title', 'content', 'description', 'created_at', 'updated_at',
+                  'version', 'forked_from')
+SELECT_PROMPT_SQL = f"SELECT {', '.join(PROMPT_COLUMNS)} FROM prompts WHERE uuid = ?"
+
+# Most recent debug messages kept on the update page
+DEBUG_LOG_SIZE = 100
+
+# With max_chars set, the browser shows the character count itself
+MAX_PROMPT_CHARS = 100000
+
+@st.cache_resource
+def get_write_lock():
+    """
+    Lock that serializes writes across sessions; reads run on their own connections
+    
+    Cached like the schema setup, since Streamlit re-executes this script (and
+    would recreate a module-level lock) on every rerun.
+    """
+    return threading.Lock()
+
+@st.cache_resource
+def ensure_schema():
+    """Create the prompts schema once per server process"""
+    with duckdb.connect(DB_PATH) as conn:
+        init_database(conn)
+
+def init_database(conn):
     """Initialize the prompts database"""
-    conn = duckdb.connect(DB_PATH)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS prompts (
             uuid VARCHAR PRIMARY KEY,
@@ -23,76 +65,108 @@ def init_database():
             forked_from VARCHAR
         )
     """)
-    conn.close()
+    # Databases created before forking existed lack this column - add it once
+    # here so queries never have to probe the schema
+    conn.execute("ALTER TABLE prompts ADD COLUMN IF NOT EXISTS forked_from VARCHAR")
 
 # Prompt management functions
 def generate_uuid():
     """Generate a new UUID for a prompt"""
     return str(uuid.uuid4())
 
-def save_prompt(prompt_data):
-    """Save a prompt to the database"""
+def _build_fts_index(conn):
+    """(Re)build the full-text index over prompt titles and descriptions"""
+    conn.execute("PRAGMA create_fts_index('prompts', 'uuid', 'title', 'description', overwrite=1)")
+
+@st.cache_resource
+def fts_enabled():
+    """Load DuckDB's fts extension and build the index once per process; False if unavailable"""
     conn = duckdb.connect(DB_PATH)
     try:
-        # Set default version if not provided
-        version = prompt_data.get('version', 1)
-        
-        # Check if forked_from is in the data
-        forked_from = prompt_data.get('forked_from', None)
-        
-        # Check if forked_from column exists
-        metadata_result = conn.execute("PRAGMA table_info(prompts)").fetchall()
-        column_names = [col[1] for col in metadata_result]
-        
-        if 'forked_from' in column_names:
-            # With forked_from field
-            conn.execute("""
-                INSERT INTO prompts (uuid, title, content, description, version, forked_from)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                prompt_data['uuid'],
-                prompt_data['title'],
-                prompt_data['content'],
-                prompt_data['description'],
-                version,
-                forked_from
-            ))
-        else:
-            # Without forked_from field
-            conn.execute("""
-                INSERT INTO prompts (uuid, title, content, description, version)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                prompt_data['uuid'],
-                prompt_data['title'],
-                prompt_data['content'],
-                prompt_data['description'],
-                version
-            ))
-        
-        conn.close()
+        # Installing the extension needs network access, so it is a setup
+        # step (see README) rather than something done on a request
+        conn.execute("LOAD fts")
+        with get_write_lock():
+            _build_fts_index(conn)
         return True
     except Exception as e:
+        print(f"Full-text search unavailable, falling back to ILIKE: {e}")
+        return False
+    finally:
         conn.close()
+
+@st.cache_resource
+def fts_stale():
+    """Set by writes; the next search rebuilds the full-text index and clears it"""
+    return threading.Event()
+
+def _invalidate_prompt_caches():
+    """Drop cached prompt lists and mark the search index stale after a write"""
+    get_all_prompts.clear()
+    search_prompts.clear()
+    export_prompt.clear()
+    # DuckDB's fts index is a snapshot, so it has to be rebuilt to see the
+    # write - once on the next search rather than after every write
+    fts_stale().set()
+
+def _prompt_row(prompt_data):
+    """Build an INSERT_PROMPT_SQL parameter tuple from a prompt dict"""
+    return (
+        prompt_data['uuid'],
+        prompt_data['title'],
+        prompt_data['content'],
+        prompt_data['description'],
+        prompt_data.get('version', 1),  # Set default version if not provided
+        prompt_data.get('forked_from', None)
+    )
+
+def _insert_rows(rows):
+    """Insert prompt rows in a single transaction - either all are saved or none"""
+    conn = duckdb.connect(DB_PATH)
+    try:
+        with get_write_lock():
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                conn.executemany(INSERT_PROMPT_SQL, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    _invalidate_prompt_caches()
+
+def save_prompt(prompt_data):
+    """Save a prompt to the database"""
+    try:
+        _insert_rows([_prompt_row(prompt_data)])
+        return True
+    except Exception as e:
         st.error(f"Error saving prompt: {e}")
         return False
 
+def save_prompts_bulk(prompts):
+    """Save many prompts (e.g. from a JSON re-import) in one transaction"""
+    try:
+        _insert_rows([_prompt_row(prompt_data) for prompt_data in prompts])
+        return True
+    except Exception as e:
+        st.error(f"Error saving prompts: {e}")
+        return False
+
 def update_prompt(prompt_data):
     """Update an existing prompt"""
     conn = duckdb.connect(DB_PATH)
     try:
-        conn.execute("""
-            UPDATE prompts 
-            SET title = ?, content = ?, description = ?, updated_at = CURRENT_TIMESTAMP,
-                version = version + 1
-            WHERE uuid = ?
-        """, (
-            prompt_data['title'],
-            prompt_data['content'],
-            prompt_data['description'],
-            prompt_data['uuid']
-        ))
+        with get_write_lock():
+            conn.execute(UPDATE_PROMPT_SQL, (
+                prompt_data['title'],
+                prompt_data['content'],
+                prompt_data['description'],
+                prompt_data['uuid']
+            ))
         conn.close()
+        _invalidate_prompt_caches()
         return True
     except Exception as e:
         conn.close()
@@ -118,12 +192,14 @@ def delete_prompt(uuid):
             return False
         
         # Delete the prompt
-        conn.execute(
-            "DELETE FROM prompts WHERE uuid = ?", 
-            [uuid]
-        )
+        with get_write_lock():
+            conn.execute(
+                "DELETE FROM prompts WHERE uuid = ?", 
+                [uuid]
+            )
         
         conn.close()
+        _invalidate_prompt_caches()
         print(f"Successfully deleted prompt with UUID: {uuid}")
         return True
     
@@ -132,41 +208,69 @@ def delete_prompt(uuid):
         return False
 
 def get_prompt_by_uuid(prompt_uuid):
-    """Get a specific prompt by UUID"""
+    """Get a specific prompt by UUID as a dict keyed by PROMPT_COLUMNS, or None"""
     conn = duckdb.connect(DB_PATH)
     try:
-        result = conn.execute("""
-            SELECT * FROM prompts WHERE uuid = ?""", (prompt_uuid,)).fetchone()
+        result = conn.execute(SELECT_PROMPT_SQL, (prompt_uuid,)).fetchone()
         conn.close()
-        return result
+        return dict(zip(PROMPT_COLUMNS, result)) if result else None
     except Exception as e:
         conn.close()
         st.error(f"Error fetching prompt: {e}")
         return None
 
-def get_all_prompts():
+# Streamlit reruns the page on every widget change - serve the list from cache
+# and drop it whenever a prompt is written
+# Lists are returned as Arrow tables - st.dataframe renders them directly, so
+# pandas is only built where a pandas API is actually needed
+@st.cache_data(ttl=300, show_spinner=False)
+def get_all_prompts() -> pa.Table:
     """Get all active prompts"""
     conn = duckdb.connect(DB_PATH)
     try:
-        # Check if forked_from column exists
-        metadata_result = conn.execute("PRAGMA table_info(prompts)").fetchall()
-        column_names = [col[1] for col in metadata_result]
-        
-        if 'forked_from' in column_names:
-            # Include forked_from in the results
-            result = conn.execute("""
-                SELECT uuid, title, description, created_at, updated_at, version, forked_from
-                FROM prompts 
-                ORDER BY updated_at DESC
-            """).fetchdf()
-        else:
-            # Without forked_from
-            result = conn.execute("""
-                SELECT uuid, title, description, created_at, updated_at, version
-                FROM prompts 
-                ORDER BY updated_at DESC
-            """).fetchdf()
-            
+        result = conn.execute("""
+            SELECT uuid, title, description, created_at, updated_at, version, forked_from
+            FROM prompts 
+            ORDER BY updated_at DESC
+        """).fetch_arrow_table()
+        conn.close()
+        return result
+    except Exception as e:
+        conn.close()
+        st.error(f"Error fetching prompts: {e}")
+        return pa.table({})
+
+def resolve_uuid_prefix(prefix):
+    """Return the full UUID of the most recently updated prompt starting with prefix, or None"""
+    conn = duckdb.connect(DB_PATH)
+    try:
+        # UUIDs are stored lowercase (str(uuid.uuid4()))
+        result = conn.execute("""
+            SELECT uuid FROM prompts
+            WHERE starts_with(uuid, ?)
+            ORDER BY updated_at DESC
+            LIMIT 1
+        """, (prefix.lower(),)).fetchone()
+        conn.close()
+        return result[0] if result else None
+    except Exception as e:
+        conn.close()
+        st.error(f"Error looking up UUID: {e}")
+        return None
+
+def get_prompts_full(prompt_uuids):
+    """Get the given prompts with all of their columns, including content, in one query"""
+    if not prompt_uuids:
+        return pd.DataFrame()
+    conn = duckdb.connect(DB_PATH)
+    try:
+        placeholders = ', '.join('?' * len(prompt_uuids))
+        result = conn.execute(f"""
+            SELECT uuid, title, content, description, created_at, updated_at, version, forked_from
+            FROM prompts 
+            WHERE uuid IN ({placeholders})
+            ORDER BY updated_at DESC
+        """, list(prompt_uuids)).fetchdf()
         conn.close()
         return result
     except Exception as e:
@@ -174,38 +278,86 @@ def get_all_prompts():
         st.error(f"Error fetching prompts: {e}")
         return pd.DataFrame()
 
-def search_prompts(search_term):
+@st.cache_data(ttl=300, show_spinner=False)
+def search_prompts(search_term) -> pa.Table:
     """Search prompts by title or description"""
     conn = duckdb.connect(DB_PATH)
     try:
-        # Check if forked_from column exists
-        metadata_result = conn.execute("PRAGMA table_info(prompts)").fetchall()
-        column_names = [col[1] for col in metadata_result]
-        
-        if 'forked_from' in column_names:
-            # Include forked_from in the results
+        result = None
+        if fts_enabled():
+            # Extensions are loaded per database instance, not stored in the file
+            conn.execute("LOAD fts")
+            if fts_stale().is_set():
+                with get_write_lock():
+                    if fts_stale().is_set():
+                        _build_fts_index(conn)
+                        fts_stale().clear()
+            # Ranked lookup in the full-text index instead of scanning every row
             result = conn.execute("""
                 SELECT uuid, title, description, created_at, updated_at, version, forked_from
-                FROM prompts 
-                WHERE (title ILIKE ? OR description ILIKE ?)
-                ORDER BY updated_at DESC
-            """, (f'%{search_term}%', f'%{search_term}%')).fetchdf()
-        else:
-            # Without forked_from
+                FROM (
+                    SELECT *, fts_main_prompts.match_bm25(uuid, ?) AS score
+                    FROM prompts
+                )
+                WHERE score IS NOT NULL
+                ORDER BY score DESC
+            """, (search_term,)).fetch_arrow_table()
+        
+        # The index matches whole (stemmed) words, so fall back to a substring
+        # scan when it finds nothing - e.g. for a partly typed word
+        if result is None or result.num_rows == 0:
+            pattern = f'%{search_term}%'
             result = conn.execute("""
-                SELECT uuid, title, description, created_at, updated_at, version
+                SELECT uuid, title, description, created_at, updated_at, version, forked_from
                 FROM prompts 
                 WHERE (title ILIKE ? OR description ILIKE ?)
                 ORDER BY updated_at DESC
-            """, (f'%{search_term}%', f'%{search_term}%')).fetchdf()
-            
+            """, (pattern, pattern)).fetch_arrow_table()
         conn.close()
         return result
     except Exception as e:
         conn.close()
         st.error(f"Error searching prompts: {e}")
-        return pd.DataFrame()
+        return pa.table({})
+
+# Export layouts, parsed once; values are escaped before they are filled in
+TOML_TMPL = '''[system_prompt]
+prompt_uuid = "{uuid}"
+title = "{title}"
+content = """
+{content}
+"""
+'''
+
+MD_TMPL = """# {title}
+
+**UUID:** `{uuid}`
+**Description:** {description}
+**Version:** {version}
+
+## Prompt Content
+
+{fence}
+{content}
+{fence}
+"""
 
+def _toml_escape(text):
+    """Escape text for a single-line TOML basic string"""
+    return (text.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+
+def _toml_escape_multiline(text):
+    """Escape text for a TOML multi-line basic string, where backslashes and \"\"\" are special"""
+    return text.replace('\\', '\\\\').replace('"""', '""\\"')
+
+def _md_fence(text):
+    """Code fence longer than any backtick run in text, so the content can't close it early"""
+    longest = max((len(run) for run in re.findall(r'`+', text)), default=0)
+    return '`' * max(3, longest + 1)
+
+# Download buttons re-request the export on every rerun; writes clear this cache
+@st.cache_data(max_entries=256, show_spinner=False)
 def export_prompt(prompt_uuid, format_type="json"):
     """Export a prompt in different formats"""
     prompt_data = get_prompt_by_uuid(prompt_uuid)
@@ -213,36 +365,58 @@ def export_prompt(prompt_uuid, format_type="json"):
         return None
     
     if format_type == "json":
-        import json
         export_data = {
-            "uuid": prompt_data[0],
-            "title": prompt_data[1],
-            "content": prompt_data[2],
-            "description": prompt_data[3],
-            "version": prompt_data[6]
+            "uuid": prompt_data['uuid'],
+            "title": prompt_data['title'],
+            "content": prompt_data['content'],
+            "description": prompt_data['description'],
+            "version": prompt_data['version']
         }
         return json.dumps(export_data, indent=2)
     elif format_type == "toml":
-        return f"""[system_prompt]
-prompt_uuid = "{prompt_data[0]}"
-title = "{prompt_data[1]}"
-content = \"\"\"
-{prompt_data[2]}
-\"\"\"
-"""
+        return TOML_TMPL.format_map({
+            'uuid': prompt_data['uuid'],
+            'title': _toml_escape(prompt_data['title']),
+            'content': _toml_escape_multiline(prompt_data['content'])
+        })
     elif format_type == "markdown":
-        return f"""# {prompt_data[1]}
-
-**UUID:** `{prompt_data[0]}`
-**Description:** {prompt_data[3] or 'No description'}
-**Version:** {prompt_data[6]}
+        return MD_TMPL.format_map({
+            'title': prompt_data['title'],
+            'uuid': prompt_data['uuid'],
+            'description': prompt_data['description'] or 'No description',
+            'version': prompt_data['version'],
+            'fence': _md_fence(prompt_data['content']),
+            'content': prompt_data['content']
+        })
 
-## Prompt Content
-
-```
-{prompt_data[2]}
-```
-"""
+# Prompt templates offered on the create page, built once rather than on every rerun
+TEMPLATES = {
+    "Assistant": {
+        "title": "Helpful Assistant",
+        "description": "A general-purpose helpful assistant",
+        "content": "You are a helpful, harmless, and honest AI assistant. You provide clear, accurate, and useful responses to user questions. Always be polite and professional."
+    },
+    "Code Helper": {
+        "title": "Programming Assistant",
+        "description": "Specialized in helping with coding tasks",
+        "content": "You are an expert programming assistant. Help users write, debug, and improve their code. Provide clear explanations and follow best practices. Always include comments in code examples."
+    },
+    "Creative Writer": {
+        "title": "Creative Writing Assistant",
+        "description": "Helps with creative writing tasks",
+        "content": "You are a creative writing assistant. Help users develop stories, characters, dialogue, and creative content. Be imaginative and inspiring while maintaining good writing structure."
+    },
+    "Analyst": {
+        "title": "Data Analyst",
+        "description": "Specialized in data analysis and insights",
+        "content": "You are a data analyst expert. Help users analyze data, create visualizations, and derive insights. Be methodical, precise, and explain your reasoning clearly."
+    },
+    "Teacher": {
+        "title": "Educational Assistant",
+        "description": "Helps with teaching and learning",
+        "content": "You are an educational assistant. Help students learn by providing clear explanations, examples, and step-by-step guidance. Adapt your teaching style to the student's level."
+    }
+}
 
 # Streamlit App
 def main():
@@ -252,27 +426,21 @@ def main():
         layout="wide"
     )
     
-    init_database()
+    # Creates the schema on first run
+    ensure_schema()
     
     # Get stats for dashboard
     prompts_df = get_all_prompts()
-    total_prompts = len(prompts_df)
+    total_prompts = prompts_df.num_rows
     
     # Sidebar navigation using radio buttons
     st.sidebar.title("Prompt Manager")
 
-    # Define pages with their icons and functions
-    pages = {
-        "📋 Browse & Search Prompts": browse_prompts_page,
-        "➕ Create New Prompt": create_prompt_page,
-        "✏️ Update Prompt": update_prompt_page
-    }
-
     # Create radio button navigation
-    selected_page = st.sidebar.radio("", list(pages.keys()))
+    selected_page = st.sidebar.radio("", list(PAGES))
 
     # Call the function for the selected page
-    pages[selected_page]()
+    PAGES[selected_page]()
 
 def browse_prompts_page():
     st.header("📋 Browse & Search Prompts")
@@ -293,12 +461,12 @@ def browse_prompts_page():
         # Save last search term in session state
         st.session_state["last_search"] = search_term
         prompts_df = search_prompts(search_term)
-        if not prompts_df.empty:
-            st.success(f"Found {len(prompts_df)} prompt(s) matching '{search_term}'")
+        if prompts_df.num_rows:
+            st.success(f"Found {prompts_df.num_rows} prompt(s) matching '{search_term}'")
         else:
+            # Nothing to list - don't fall back to a second, unfiltered read
             st.info(f"No prompts found matching '{search_term}'")
-            # Fallback to showing all prompts
-            prompts_df = get_all_prompts()
+            return
     else:
         # Clear last search if search field is empty
         if not search_term:
@@ -306,40 +474,24 @@ def browse_prompts_page():
                 del st.session_state["last_search"]
         prompts_df = get_all_prompts()
     
-    if prompts_df.empty:
+    if prompts_df.num_rows == 0:
         st.info("No prompts found. Create your first prompt!")
         return
     
-    st.write(f"Showing {len(prompts_df)} prompts")
+    st.write(f"Showing {prompts_df.num_rows} prompts")
     
-    # Check if forked_from column exists in the dataframe
-    if 'forked_from' in prompts_df.columns:
-        # Display table with forked_from info
-        st.dataframe(
-            prompts_df[['title', 'description', 'uuid', 'version', 'forked_from']],
-            hide_index=True,
-            height=200,
-            column_config={
-                "title": st.column_config.TextColumn("Title"),
-                "description": st.column_config.TextColumn("Description"),
-                "uuid": st.column_config.TextColumn("UUID"),
-                "version": st.column_config.NumberColumn("Version"),
-                "forked_from": st.column_config.TextColumn("Forked From")
-            }
-        )
-    else:
-        # Display table without forked_from
-        st.dataframe(
-            prompts_df[['title', 'description', 'uuid', 'version']],
-            hide_index=True,
-            height=200,
-            column_config={
-                "title": st.column_config.TextColumn("Title"),
-                "description": st.column_config.TextColumn("Description"),
-                "uuid": st.column_config.TextColumn("UUID"),
-                "version": st.column_config.NumberColumn("Version")
-            }
-        )
+    st.dataframe(
+        prompts_df.select(['title', 'description', 'uuid', 'version', 'forked_from']),
+        hide_index=True,
+        height=200,
+        column_config={
+            "title": st.column_config.TextColumn("Title"),
+            "description": st.column_config.TextColumn("Description"),
+            "uuid": st.column_config.TextColumn("UUID"),
+            "version": st.column_config.NumberColumn("Version"),
+            "forked_from": st.column_config.TextColumn("Forked From")
+        }
+    )
 
     st.divider()
 
@@ -348,29 +500,26 @@ def browse_prompts_page():
     bulk_format = st.selectbox("Bulk export format:", ["JSON", "CSV"])
     
     if st.button("📦 Export All"):
-        filtered_df = prompts_df.copy()
-        
         if bulk_format == "JSON":
-            import json
+            # One query for the listed prompts' content rather than one per prompt
+            full_df = get_prompts_full(prompts_df.column('uuid').to_pylist())
             export_data = []
-            for _, prompt in filtered_df.iterrows():
-                prompt_data = get_prompt_by_uuid(prompt['uuid'])
-                if prompt_data:
-                    export_item = {
-                        "uuid": prompt_data[0],
-                        "title": prompt_data[1],
-                        "content": prompt_data[2],
-                        "description": prompt_data[3],
-                        "version": prompt_data[6],
-                        "created_at": str(prompt['created_at']),
-                        "updated_at": str(prompt['updated_at'])
-                    }
-                    
-                    # Add forked_from if available
-                    if 'forked_from' in prompt and not pd.isna(prompt['forked_from']):
-                        export_item["forked_from"] = prompt['forked_from']
-                    
-                    export_data.append(export_item)
+            for prompt in full_df.to_dict(orient='records'):
+                export_item = {
+                    "uuid": prompt['uuid'],
+                    "title": prompt['title'],
+                    "content": prompt['content'],
+                    "description": prompt['description'],
+                    "version": prompt['version'],
+                    "created_at": str(prompt['created_at']),
+                    "updated_at": str(prompt['updated_at'])
+                }
+                
+                # Add forked_from if available
+                if not pd.isna(prompt['forked_from']):
+                    export_item["forked_from"] = prompt['forked_from']
+                
+                export_data.append(export_item)
             
             json_content = json.dumps(export_data, indent=2)
             st.download_button(
@@ -381,7 +530,7 @@ def browse_prompts_page():
             )
             
         elif bulk_format == "CSV":
-            csv_content = filtered_df.to_csv(index=False)
+            csv_content = prompts_df.to_pandas().to_csv(index=False)
             st.download_button(
                 label="⬇️ Download CSV",
                 data=csv_content,
@@ -389,53 +538,18 @@ def browse_prompts_page():
                 mime="text/csv"
             )
         
-        st.success(f"Exported {len(filtered_df)} prompts!")
+        st.success(f"Exported {prompts_df.num_rows} prompts!")
 
 def create_prompt_page():
     st.subheader("➕ Create New Prompt")
     
     # Template selection
     with st.expander("📋 Use Template (Optional)"):
-        template_type = st.selectbox("Choose a template", [
-            "None",
-            "Assistant",
-            "Code Helper", 
-            "Creative Writer",
-            "Analyst",
-            "Teacher"
-        ])
-        
-        templates = {
-            "Assistant": {
-                "title": "Helpful Assistant",
-                "description": "A general-purpose helpful assistant",
-                "content": "You are a helpful, harmless, and honest AI assistant. You provide clear, accurate, and useful responses to user questions. Always be polite and professional."
-            },
-            "Code Helper": {
-                "title": "Programming Assistant",
-                "description": "Specialized in helping with coding tasks",
-                "content": "You are an expert programming assistant. Help users write, debug, and improve their code. Provide clear explanations and follow best practices. Always include comments in code examples."
-            },
-            "Creative Writer": {
-                "title": "Creative Writing Assistant",
-                "description": "Helps with creative writing tasks",
-                "content": "You are a creative writing assistant. Help users develop stories, characters, dialogue, and creative content. Be imaginative and inspiring while maintaining good writing structure."
-            },
-            "Analyst": {
-                "title": "Data Analyst",
-                "description": "Specialized in data analysis and insights",
-                "content": "You are a data analyst expert. Help users analyze data, create visualizations, and derive insights. Be methodical, precise, and explain your reasoning clearly."
-            },
-            "Teacher": {
-                "title": "Educational Assistant",
-                "description": "Helps with teaching and learning",
-                "content": "You are an educational assistant. Help students learn by providing clear explanations, examples, and step-by-step guidance. Adapt your teaching style to the student's level."
-            }
-        }
+        template_type = st.selectbox("Choose a template", ["None", *TEMPLATES])
     
     with st.form("create_prompt_form"):
         # Pre-fill from template if selected
-        template_data = templates.get(template_type, {})
+        template_data = TEMPLATES.get(template_type, {})
         
         title = st.text_input(
             "Prompt Title*", 
@@ -452,14 +566,11 @@ def create_prompt_page():
             "Prompt Content*", 
             value=template_data.get("content", ""),
             height=400,
+            max_chars=MAX_PROMPT_CHARS,
             placeholder="Enter your system prompt here...",
             help="This is the actual prompt that will be sent to the LLM"
         )
         
-        # Character count
-        char_count = len(content)
-        st.caption(f"Character count: {char_count:,}")
-        
         submitted = st.form_submit_button("💾 Save Prompt", type="primary")
         
         if submitted:
@@ -493,20 +604,29 @@ def update_prompt_page():
     
     # Debug section (collapsible)
     with st.expander("Debug Log", expanded=False):
+        # Keep only the latest messages so a long session can't grow the log forever
         if "debug_messages" not in st.session_state:
-            st.session_state.debug_messages = []
+            st.session_state.debug_messages = deque(maxlen=DEBUG_LOG_SIZE)
         
         # Clear log button
         if st.button("Clear Debug Log"):
-            st.session_state.debug_messages = []
+            st.session_state.debug_messages.clear()
         
-        # Display debug messages
-        for i, msg in enumerate(st.session_state.debug_messages):
-            st.text(f"{i+1}. {msg}")
+        # Display debug messages as one block rather than one widget per message
+        if st.session_state.debug_messages:
+            st.code("\n".join(f"{i+1}. {msg}" for i, msg in enumerate(st.session_state.debug_messages)),
+                    language="text")
     
     # Function to add debug messages
+    # Messages are stamped with seconds since the session started - a clock
+    # read is cheaper than formatting local wall time for each one. The start
+    # lives in session state because the script re-executes on every rerun
+    if "debug_start" not in st.session_state:
+        st.session_state.debug_start = time.perf_counter()
+    
     def add_debug(message):
-        st.session_state.debug_messages.append(f"[{time.strftime('%H:%M:%S')}] {message}")
+        elapsed = time.perf_counter() - st.session_state.debug_start
+        st.session_state.debug_messages.append(f"[{elapsed:8.3f}s] {message}")
     
     # Function to handle UUID submission
     def on_uuid_submit():
@@ -516,12 +636,10 @@ def update_prompt_page():
             
             # Check if it's a partial UUID
             if len(uuid_input) < 36:  # Standard UUID is 36 chars
-                prompts_df = get_all_prompts()
-                for _, row in prompts_df.iterrows():
-                    if uuid_input.lower() in row['uuid'].lower():
-                        st.session_state.selected_uuid = row['uuid']  # Set to full UUID
-                        add_debug(f"Partial UUID matched to: {row['uuid']}")
-                        break
+                full_uuid = resolve_uuid_prefix(uuid_input)
+                if full_uuid:
+                    st.session_state.selected_uuid = full_uuid  # Set to full UUID
+                    add_debug(f"Partial UUID matched to: {full_uuid}")
                 else:
                     st.session_state.selected_uuid = uuid_input
             else:
@@ -595,8 +713,9 @@ def update_prompt_page():
                 if 'current_version' in st.session_state:
                     st.session_state.current_version += 1
             
-            st.success(success_msg)
-            time.sleep(0.8)  # Brief pause to show the success message
+            # A toast survives the rerun, so there's no need to block the
+            # script thread to keep the message on screen
+            st.toast(success_msg)
             st.rerun()  # Refresh the page to show updated data
         else:
             error_msg = f"Failed to {action_type} prompt"
@@ -615,23 +734,16 @@ def update_prompt_page():
     
     # Get available prompts for reference
     prompts_df = get_all_prompts()
-    if prompts_df.empty:
+    if prompts_df.num_rows == 0:
         st.info("No prompts available to edit.")
         return
     
     # Display available UUIDs
     with st.expander("Available Prompt UUIDs (Click to expand)"):
-        # Show forked_from if available
-        if 'forked_from' in prompts_df.columns:
-            st.dataframe(
-                prompts_df[['uuid', 'title', 'version', 'forked_from']],
-                hide_index=True
-            )
-        else:
-            st.dataframe(
-                prompts_df[['uuid', 'title', 'version']],
-                hide_index=True
-            )
+        st.dataframe(
+            prompts_df.select(['uuid', 'title', 'version', 'forked_from']),
+            hide_index=True
+        )
     
     # Only show the edit form if a UUID has been loaded
     if st.session_state.prompt_loaded and st.session_state.selected_uuid:
@@ -639,17 +751,17 @@ def update_prompt_page():
         prompt_data = get_prompt_by_uuid(st.session_state.selected_uuid)
         
         if prompt_data:
-            add_debug(f"Prompt found: {prompt_data[1]}")
+            add_debug(f"Prompt found: {prompt_data['title']}")
             
             # Store version in session state
-            st.session_state.current_version = 0 if prompt_data[6] is None else prompt_data[6]
+            st.session_state.current_version = 0 if prompt_data['version'] is None else prompt_data['version']
             
             # Show current version info
-            st.info(f"Editing: **{prompt_data[1]}** - UUID: `{prompt_data[0]}`")
+            st.info(f"Editing: **{prompt_data['title']}** - UUID: `{prompt_data['uuid']}`")
             
-            # Display forked info if available (column index 7 should be forked_from)
-            if len(prompt_data) > 7 and prompt_data[7]:
-                forked_parent = prompt_data[7]
+            # Display forked info if available
+            if prompt_data['forked_from']:
+                forked_parent = prompt_data['forked_from']
                 st.caption(f"This prompt was forked from: `{forked_parent}`")
             
             # Fork checkbox (outside the form for immediate effect)
@@ -672,26 +784,23 @@ def update_prompt_page():
                 st.text_input(
                     "Prompt Title*", 
                     key="title_input",
-                    value=prompt_data[1]
+                    value=prompt_data['title']
                 )
                 
                 st.text_area(
                     "Prompt Content*", 
                     key="content_input",
-                    value=prompt_data[2],
-                    height=300
+                    value=prompt_data['content'],
+                    height=300,
+                    max_chars=MAX_PROMPT_CHARS
                 )
                 
                 st.text_area(
                     "Description", 
                     key="description_input",
-                    value=prompt_data[3] or ""
+                    value=prompt_data['description'] or ""
                 )
                 
-                # Character count
-                char_count = len(st.session_state.content_input)
-                st.caption(f"Character count: {char_count:,}")
-                
                 # Update button with dynamic label based on session state
                 button_label = "Create New Version" if st.session_state.create_new_uuid else "Update Prompt"
                 st.form_submit_button(button_label, on_click=on_update_submit)
@@ -699,5 +808,12 @@ def update_prompt_page():
             st.error(f"No prompt found with UUID: {st.session_state.selected_uuid}")
             add_debug("No matching prompt found")
 
+# Pages with their icons and functions - defined after the page functions it refers to
+PAGES = {
+    "📋 Browse & Search Prompts": browse_prompts_page,
+    "➕ Create New Prompt": create_prompt_page,
+    "✏️ Update Prompt": update_prompt_page
+}
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,15 +3,103 @@ Prompt utils - Database interface for prompt management
 """
 
 import os
-import toml
+import logging
 import duckdb
-import uuid
+import re
 import threading
 from typing import Optional, List, Dict
 from functools import lru_cache
 
+logger = logging.getLogger(__name__)
+
+# pyarrow is optional - with it, list results are built column-wise in C
+try:
+    import pyarrow  # noqa: F401
+
+    def _fetch_dicts(cursor) -> List[Dict]:
+        return cursor.fetch_arrow_table().to_pylist()
+except ImportError:
+    def _fetch_dicts(cursor) -> List[Dict]:
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+        columns = tuple(c[0] for c in cursor.description)
+        return [dict(zip(columns, row)) for row in rows]
+
+# Canonical hyphenated UUIDs only - the form every prompt is stored under
+_UUID_RE = re.compile(r'\A[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\Z')
+
+def _valid_uuid(value) -> bool:
+    """Check UUID format without constructing a uuid.UUID"""
+    return isinstance(value, str) and _UUID_RE.match(value) is not None
+
+# SQL is built once at import rather than per call. DuckDB's Python client has
+# no prepared-statement handle, so parameters are still bound on execute.
+SELECT_CONTENT_SQL = "SELECT content FROM prompts WHERE uuid = ?"
+LIST_PROMPTS_SQL = """
+    SELECT uuid,
+           coalesce(nullif(title, ''), 'Untitled') AS title,
+           coalesce(description, '') AS description,
+           created_at, updated_at
+    FROM prompts
+    ORDER BY updated_at DESC
+"""
+PROMPT_COLUMNS = ('uuid', 'title', 'description', 'content', 'created_at', 'updated_at')
+_PROMPT_SELECT = """
+    SELECT uuid,
+           coalesce(nullif(title, ''), 'Untitled'),
+           coalesce(description, ''),
+           content, created_at, updated_at
+    FROM prompts
+"""
+SELECT_PROMPT_SQL = _PROMPT_SELECT + "WHERE uuid = ?"
+# Filled with one placeholder per requested UUID
+SELECT_PROMPTS_SQL = _PROMPT_SELECT + "WHERE uuid IN ({})"
+# uuid is the primary key, so create-or-update is a single atomic statement.
+# now() rather than CURRENT_TIMESTAMP: inside DO UPDATE SET, DuckDB binds the
+# bare keyword as a column name and the whole statement fails
+UPSERT_SQL = """
+    INSERT INTO prompts (uuid, title, description, content, created_at, updated_at)
+    VALUES (?, ?, ?, ?, now(), now())
+    ON CONFLICT (uuid) DO UPDATE
+    SET title = EXCLUDED.title, description = EXCLUDED.description,
+        content = EXCLUDED.content, updated_at = now()
+"""
+DELETE_SQL = "DELETE FROM prompts WHERE uuid = ? RETURNING uuid"
+
+# Lookups here are point selects and small lists, so reads run on one thread
+# instead of spinning up DuckDB's thread pool per query
+READ_CONFIG = {'threads': 1}
+
+@lru_cache(maxsize=32)
+def _require_db(db_path: str) -> None:
+    """
+    Raise FileNotFoundError unless db_path exists
+
+    Only successful checks are cached, so a database created later is still
+    found; writes clear the cache on failure in case the file went away.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+
+class _PromptNotFound(LookupError):
+    """Raised by _fetch_content so that misses are not cached"""
+
+@lru_cache(maxsize=128)
+def _fetch_content(db_path: str, prompt_uuid: str) -> str:
+    """
+    Read a prompt's content for checkout, cached per (db_path, prompt_uuid)
+
+    lru_cache is bounded and thread-safe; missing or empty prompts raise
+    _PromptNotFound so they are looked up again next time.
+    """
+    with duckdb.connect(db_path, read_only=True, config=READ_CONFIG) as conn:
+        row = conn.execute(SELECT_CONTENT_SQL, [prompt_uuid]).fetchone()
+    if not row or not row[0]:
+        raise _PromptNotFound(prompt_uuid)
+    return row[0]
+
 class PromptLibrary:
-    _cache = {}  # Simple in-memory cache
     _lock = threading.Lock()  # Thread safety lock
     
     def __init__(self, prompt_id: str, db_path: str):
@@ -23,16 +111,28 @@ class PromptLibrary:
             db_path: Path to prompts database
         """
         # Validate UUID format
-        try:
-            uuid.UUID(prompt_id)
-        except ValueError:
+        if not _valid_uuid(prompt_id):
             raise ValueError(f"Invalid UUID format: {prompt_id}")
         
         self.prompt_uuid = prompt_id
         self.db_path = db_path
         
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database file not found: {db_path}")
+        _require_db(db_path)
+    
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def for_prompt(prompt_id: str, db_path: str) -> 'PromptLibrary':
+        """
+        Shared PromptLibrary for a prompt, so repeat loads skip validation
+        
+        Args:
+            prompt_id: UUID of the prompt to retrieve
+            db_path: Path to prompts database
+            
+        Returns:
+            Cached PromptLibrary instance (construction errors are not cached)
+        """
+        return PromptLibrary(prompt_id, db_path)
     
     def checkout(self) -> Optional[str]:
         """
@@ -41,28 +141,13 @@ class PromptLibrary:
         Returns:
             str: The prompt content if found, None if not found
         """
-        # Check cache first
-        if self.prompt_uuid in self._cache:
-            return self._cache[self.prompt_uuid]
-        
         try:
-            # Use read_only=True for read operations
-            with duckdb.connect(self.db_path, read_only=True) as conn:
-                result = conn.execute("""
-                    SELECT content FROM prompts 
-                    WHERE uuid = ?
-                """, [self.prompt_uuid]).fetchone()
-                
-                if result and result[0]:
-                    # Cache the result
-                    self._cache[self.prompt_uuid] = result[0]
-                    return result[0]
-                else:
-                    print(f"Warning: No prompt found with UUID {self.prompt_uuid}")
-                    return None
-                    
-        except Exception as e:
-            print(f"Database error in checkout: {e}")
+            return _fetch_content(self.db_path, self.prompt_uuid)
+        except _PromptNotFound:
+            logger.warning("No prompt found with UUID %s", self.prompt_uuid)
+            return None
+        except Exception:
+            logger.exception("Database error in checkout")
             return None
     
     @staticmethod
@@ -76,32 +161,16 @@ class PromptLibrary:
         Returns:
             List of dictionaries containing prompt metadata
         """
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database file not found: {db_path}")
+        _require_db(db_path)
         
         try:
             # Use read_only=True for read operations
-            with duckdb.connect(db_path, read_only=True) as conn:
-                results = conn.execute("""
-                    SELECT uuid, title, description, created_at, updated_at
-                    FROM prompts 
-                    ORDER BY updated_at DESC
-                """).fetchall()
-                
-                prompts = []
-                for row in results:
-                    prompts.append({
-                        'uuid': row[0],
-                        'title': row[1] if row[1] else 'Untitled',
-                        'description': row[2] if row[2] else '',
-                        'created_at': row[3],
-                        'updated_at': row[4]
-                    })
-                
-                return prompts
+            with duckdb.connect(db_path, read_only=True, config=READ_CONFIG) as conn:
+                # Title/description defaults are applied in SQL
+                return _fetch_dicts(conn.execute(LIST_PROMPTS_SQL))
                 
-        except Exception as e:
-            print(f"Database error in list_all_prompts: {e}")
+        except Exception:
+            logger.exception("Database error in list_all_prompts")
             return []
     
     @staticmethod
@@ -117,39 +186,56 @@ class PromptLibrary:
             Dictionary with prompt data or None if not found
         """
         # Validate UUID format
-        try:
-            uuid.UUID(prompt_uuid)
-        except ValueError:
+        if not _valid_uuid(prompt_uuid):
             raise ValueError(f"Invalid UUID format: {prompt_uuid}")
         
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database file not found: {db_path}")
+        _require_db(db_path)
         
         try:
-            # Use read_only=True for read operations
-            with duckdb.connect(db_path, read_only=True) as conn:
-                result = conn.execute("""
-                    SELECT uuid, title, description, content, created_at, updated_at
-                    FROM prompts 
-                    WHERE uuid = ?
-                """, [prompt_uuid]).fetchone()
-                
-                if result:
-                    return {
-                        'uuid': result[0],
-                        'title': result[1] if result[1] else 'Untitled',
-                        'description': result[2] if result[2] else '',
-                        'content': result[3],
-                        'created_at': result[4],
-                        'updated_at': result[5]
-                    }
-                else:
-                    return None
-                    
-        except Exception as e:
-            print(f"Database error in get_prompt_by_uuid: {e}")
+            # Not cached: prompt_tracker edits rows from its own process, and
+            # the prompts API should return the current version
+            with duckdb.connect(db_path, read_only=True, config=READ_CONFIG) as conn:
+                # Title/description defaults are applied in SQL
+                row = conn.execute(SELECT_PROMPT_SQL, [prompt_uuid]).fetchone()
+            return dict(zip(PROMPT_COLUMNS, row)) if row else None
+        except Exception:
+            logger.exception("Database error in get_prompt_by_uuid")
             return None
     
+    @staticmethod
+    def get_prompts_by_uuids(db_path: str, prompt_uuids: List[str]) -> Dict[str, Dict]:
+        """
+        Get several prompts by UUID in a single query
+        
+        Args:
+            db_path: Path to prompts database
+            prompt_uuids: UUIDs of the prompts
+            
+        Returns:
+            Dictionary mapping each found UUID to its prompt data (missing UUIDs are omitted)
+        """
+        # Validate UUID format
+        for prompt_uuid in prompt_uuids:
+            if not _valid_uuid(prompt_uuid):
+                raise ValueError(f"Invalid UUID format: {prompt_uuid}")
+        
+        _require_db(db_path)
+        
+        wanted = list(dict.fromkeys(prompt_uuids))
+        if not wanted:
+            return {}
+        
+        try:
+            sql = SELECT_PROMPTS_SQL.format(', '.join('?' * len(wanted)))
+            with duckdb.connect(db_path, read_only=True, config=READ_CONFIG) as conn:
+                rows = conn.execute(sql, wanted).fetchall()
+            if not rows:
+                return {}
+            return {row[0]: dict(zip(PROMPT_COLUMNS, row)) for row in rows}
+        except Exception:
+            logger.exception("Database error in get_prompts_by_uuids")
+            return {}
+    
     @staticmethod
     def set_prompt(db_path: str, prompt_uuid: str, title: str, description: str, content: str) -> bool:
         """
@@ -166,46 +252,25 @@ class PromptLibrary:
             bool: True if successful, False otherwise
         """
         # Validate UUID format
-        try:
-            uuid.UUID(prompt_uuid)
-        except ValueError:
+        if not _valid_uuid(prompt_uuid):
             raise ValueError(f"Invalid UUID format: {prompt_uuid}")
         
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database file not found: {db_path}")
+        _require_db(db_path)
         
         try:
             # For write operations, we need the lock for thread safety
             with PromptLibrary._lock:
                 # For write operations, don't use read_only
                 with duckdb.connect(db_path) as conn:
-                    # Check if prompt exists
-                    existing = conn.execute("""
-                        SELECT uuid FROM prompts WHERE uuid = ?
-                    """, [prompt_uuid]).fetchone()
-                    
-                    if existing:
-                        # Update existing prompt
-                        conn.execute("""
-                            UPDATE prompts 
-                            SET title = ?, description = ?, content = ?, updated_at = CURRENT_TIMESTAMP
-                            WHERE uuid = ?
-                        """, [title, description, content, prompt_uuid])
-                    else:
-                        # Insert new prompt
-                        conn.execute("""
-                            INSERT INTO prompts (uuid, title, description, content, created_at, updated_at)
-                            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                        """, [prompt_uuid, title, description, content])
+                    conn.execute(UPSERT_SQL, [prompt_uuid, title, description, content])
                 
-                # Clear cache for this prompt
-                if prompt_uuid in PromptLibrary._cache:
-                    del PromptLibrary._cache[prompt_uuid]
+                PromptLibrary.invalidate(prompt_uuid)
                 
                 return True
                 
-        except Exception as e:
-            print(f"Database error in set_prompt: {e}")
+        except Exception:
+            _require_db.cache_clear()
+            logger.exception("Database error in set_prompt")
             return False
     
     @staticmethod
@@ -221,43 +286,80 @@ class PromptLibrary:
             bool: True if successful, False otherwise
         """
         # Validate UUID format
-        try:
-            uuid.UUID(prompt_uuid)
-        except ValueError:
+        if not _valid_uuid(prompt_uuid):
             raise ValueError(f"Invalid UUID format: {prompt_uuid}")
         
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database file not found: {db_path}")
+        _require_db(db_path)
         
         try:
             # For write operations, we need the lock for thread safety
             with PromptLibrary._lock:
                 # For write operations, don't use read_only
                 with duckdb.connect(db_path) as conn:
-                    # Check if prompt exists
-                    existing = conn.execute("""
-                        SELECT uuid FROM prompts WHERE uuid = ?
-                    """, [prompt_uuid]).fetchone()
-                    
-                    if not existing:
-                        return False  # Prompt doesn't exist
+                    # RETURNING yields no row when the prompt doesn't exist
+                    deleted = conn.execute(DELETE_SQL, [prompt_uuid]).fetchone()
                     
-                    # Delete the prompt
-                    conn.execute("""
-                        DELETE FROM prompts WHERE uuid = ?
-                    """, [prompt_uuid])
+                    if not deleted:
+                        return False
                 
-                # Clear cache for this prompt
-                if prompt_uuid in PromptLibrary._cache:
-                    del PromptLibrary._cache[prompt_uuid]
+                PromptLibrary.invalidate(prompt_uuid)
                 
                 return True
                 
-        except Exception as e:
-            print(f"Database error in delete_prompt: {e}")
+        except Exception:
+            _require_db.cache_clear()
+            logger.exception("Database error in delete_prompt")
             return False
 
+    @classmethod
+    def invalidate(cls, prompt_uuid: str):
+        """
+        Drop cached data for a prompt after it is written or deleted
+
+        Args:
+            prompt_uuid: UUID of the changed prompt
+        """
+        # lru_cache can't evict a single key, so the cache is cleared whole
+        _fetch_content.cache_clear()
+
     @classmethod
     def clear_cache(cls):
         """Clear the prompt cache"""
-        cls._cache.clear()
\ No newline at end of file
+        _fetch_content.cache_clear()
+
+
+if __name__ == "__main__":
+    # Smoke check: create and then update a prompt through set_prompt on a
+    # throwaway database with the prompt_tracker schema
+    import tempfile
+    import uuid
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "prompts.db")
+        with duckdb.connect(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE prompts (
+                    uuid VARCHAR PRIMARY KEY,
+                    title VARCHAR NOT NULL,
+                    content TEXT NOT NULL,
+                    description TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    version INTEGER DEFAULT 1,
+                    forked_from VARCHAR
+                )
+            """)
+
+        prompt_uuid = str(uuid.uuid4())
+        assert PromptLibrary.set_prompt(db_path, prompt_uuid, "First", "desc", "v1"), "insert failed"
+        assert PromptLibrary.get_prompt_by_uuid(db_path, prompt_uuid)['content'] == "v1"
+
+        assert PromptLibrary.set_prompt(db_path, prompt_uuid, "Second", "desc", "v2"), "update failed"
+        prompt = PromptLibrary.get_prompt_by_uuid(db_path, prompt_uuid)
+        assert (prompt['title'], prompt['content']) == ("Second", "v2")
+        assert PromptLibrary.for_prompt(prompt_uuid, db_path).checkout() == "v2"
+        assert len(PromptLibrary.list_all_prompts(db_path)) == 1
+
+        assert PromptLibrary.delete_prompt(db_path, prompt_uuid)
+        assert not PromptLibrary.delete_prompt(db_path, prompt_uuid)
+    print("prompt_utils smoke check passed")
@@ -4,18 +4,75 @@ Handles session and conversation tracking for the chat application using Redis f
 Falls back to in-memory storage if Redis is unavailable.
 """
 
-import json
 import redis
 import socket
-from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Union, Any
+import sys
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from datetime import datetime
+from typing import Dict, Optional, List, Union, Any, NamedTuple
 import logging
 from contextlib import contextmanager
 
+# orjson is optional - it serializes messages in native code and hands Redis
+# bytes directly; the stdlib fallback produces the same JSON
+try:
+    import orjson
+
+    def _json_dumps(data) -> Union[str, bytes]:
+        return orjson.dumps(data, default=str)
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def _json_dumps(data) -> Union[str, bytes]:
+        return json.dumps(data, default=str)
+
+    _json_loads = json.loads
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Messages kept per conversation; older ones are dropped. Callers only read the
+# last few for context, and message_count still counts every message.
+MAX_MESSAGES_KEPT = 100
+
+# Caps on the in-memory fallback, which otherwise grows until cleanup runs.
+# The oldest entries are evicted first, matching how TTLs expire them in Redis.
+MAX_SESSIONS_IN_MEMORY = 10000
+MAX_CONVERSATIONS_IN_MEMORY = 50000
+
+# Appends a user/assistant pair and bumps every counter in one round trip.
+# KEYS: conversation hash, message list, session hash, stats hash
+# ARGV: ttl, max messages kept, user message JSON, assistant message JSON
+ADD_MESSAGE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[3], ARGV[4])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('HINCRBY', KEYS[1], 'message_count', 2)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('HINCRBY', KEYS[3], 'message_count', 2)
+end
+redis.call('HINCRBY', KEYS[4], 'total_messages', 2)
+return 1
+"""
+
+class Message(NamedTuple):
+    """
+    One chat message in the in-memory store - a tuple is far smaller than a dict.
+    Public getters hand messages out as dicts via _asdict().
+    """
+    role: str
+    content: str
+    timestamp: float
+
 class SessionManager:
     """
     Manages user sessions and conversations using Redis for persistence.
@@ -50,9 +107,9 @@ class SessionManager:
         self.default_conversation_ttl = default_conversation_ttl
         self.redis_available = False  # Flag to track Redis availability
         
-        # Initialize in-memory storage as fallback
-        self.sessions = {}
-        self.conversations = {}
+        # Initialize in-memory storage as fallback, kept in creation order
+        self.sessions: OrderedDict = OrderedDict()
+        self.conversations: OrderedDict = OrderedDict()
         self.stats = {'total_sessions': 0, 'total_conversations': 0, 'total_messages': 0}
         
         # Initialize Redis connection pool with timeouts
@@ -69,6 +126,9 @@ class SessionManager:
                 socket_connect_timeout=connection_timeout
             )
             
+            # Scripts are sent once and then run by SHA
+            self._add_message_script = redis.Redis(connection_pool=self.redis_pool).register_script(ADD_MESSAGE_LUA)
+            
             # Test connection
             self._test_connection()
         except Exception as e:
@@ -119,9 +179,9 @@ class SessionManager:
             raise redis.ConnectionError("Redis pool not initialized")
             
         try:
+            # No ping here - it cost a round trip per call, and a dead connection
+            # fails the real command just the same
             client = redis.Redis(connection_pool=self.redis_pool)
-            # Test the connection with a ping
-            client.ping()
             yield client
         except redis.ConnectionError as e:
             logger.error(f"Redis connection failed: {e}")
@@ -136,29 +196,85 @@ class SessionManager:
             self.redis_available = False
             raise
     
+    # Sessions and conversations are Redis hashes, so counters are updated with
+    # HINCRBY server-side, and messages live in a separate list that is appended
+    # with RPUSH and read with LRANGE instead of rewriting one JSON blob per turn.
+    # The key names differ from the old JSON-string layout so the two never clash.
     def _session_key(self, session_id: str) -> str:
-        """Generate Redis key for session data."""
-        return f"{self.key_prefix}:session:{session_id}"
+        """Generate Redis key for the session hash."""
+        return f"{self.key_prefix}:sess:{session_id}"
     
     def _conversation_key(self, conversation_id: str) -> str:
-        """Generate Redis key for conversation data."""
-        return f"{self.key_prefix}:conversation:{conversation_id}"
+        """Generate Redis key for the conversation hash."""
+        return f"{self.key_prefix}:conv:{conversation_id}"
+    
+    def _messages_key(self, conversation_id: str) -> str:
+        """Generate Redis key for a conversation's message list."""
+        return f"{self.key_prefix}:conv:{conversation_id}:messages"
     
     def _session_conversations_key(self, session_id: str) -> str:
         """Generate Redis key for session's conversation list."""
-        return f"{self.key_prefix}:session:{session_id}:conversations"
+        return f"{self.key_prefix}:sess:{session_id}:conversations"
+    
+    def _session_index_key(self) -> str:
+        """Generate Redis key for the sorted set of sessions by expiry time."""
+        return f"{self.key_prefix}:sessions_by_expiry"
     
     def _stats_key(self) -> str:
         """Generate Redis key for global stats."""
         return f"{self.key_prefix}:stats"
     
-    def _serialize_data(self, data: dict) -> str:
-        """Serialize data to JSON string."""
-        return json.dumps(data, default=str)
+    def _serialize_data(self, data: dict) -> Union[str, bytes]:
+        """Serialize data to JSON."""
+        return _json_dumps(data)
     
-    def _deserialize_data(self, data: str) -> dict:
-        """Deserialize JSON string to dict."""
-        return json.loads(data) if data else {}
+    def _deserialize_data(self, data: Union[str, bytes]) -> dict:
+        """Deserialize JSON to dict."""
+        return _json_loads(data) if data else {}
+    
+    @staticmethod
+    def _intern(value: Optional[str]) -> Optional[str]:
+        """Intern an ID held in memory - each one is referenced from many records."""
+        return sys.intern(value) if isinstance(value, str) else value
+    
+    @staticmethod
+    def _hash_fields(data: dict) -> dict:
+        """Drop None values, which Redis hashes can't store (missing reads back as None)."""
+        return {key: value for key, value in data.items() if value is not None}
+    
+    def _load_session(self, client: redis.Redis, session_id: str) -> Optional[dict]:
+        """Read a session hash and its conversation list in one round trip."""
+        pipe = client.pipeline(transaction=False)
+        pipe.hgetall(self._session_key(session_id))
+        pipe.lrange(self._session_conversations_key(session_id), 0, -1)
+        fields, conversation_ids = pipe.execute()
+        if not fields:
+            return None
+        return {
+            'session_id': fields.get('session_id'),
+            'start_time': fields.get('start_time'),
+            'created_at': float(fields['created_at']) if 'created_at' in fields else None,
+            'conversation_count': int(fields.get('conversation_count', 0)),
+            'message_count': int(fields.get('message_count', 0)),
+            'conversations': conversation_ids[::-1]  # stored newest first
+        }
+    
+    def _load_conversation(self, client: redis.Redis, conversation_id: str) -> Optional[dict]:
+        """Read a conversation hash and its messages in one round trip."""
+        pipe = client.pipeline(transaction=False)
+        pipe.hgetall(self._conversation_key(conversation_id))
+        pipe.lrange(self._messages_key(conversation_id), 0, -1)
+        fields, messages = pipe.execute()
+        if not fields:
+            return None
+        return {
+            'conversation_id': fields.get('conversation_id'),
+            'session_id': fields.get('session_id'),
+            'start_time': fields.get('start_time'),
+            'created_at': float(fields['created_at']) if 'created_at' in fields else None,
+            'messages': [self._deserialize_data(message) for message in messages],
+            'message_count': int(fields.get('message_count', 0))
+        }
     
     def initialize_session(self, session_id: str, session_start_time: str, ttl: Optional[int] = None) -> dict:
         """
@@ -184,15 +300,15 @@ class SessionManager:
             
             with self._get_redis_client() as client:
                 # Check if session already exists
-                if client.exists(session_key):
-                    existing_data = self._deserialize_data(client.get(session_key))
-                    logger.info(f"Session {session_id} already exists, returning existing data")
+                existing_data = self._load_session(client, session_id)
+                if existing_data:
+                    logger.debug("Session %s already exists, returning existing data", session_id)
                     return existing_data
                 
                 session_data = {
                     'session_id': session_id,
                     'start_time': session_start_time,
-                    'created_at': datetime.now().isoformat(),
+                    'created_at': time.time(),
                     'conversation_count': 0,
                     'message_count': 0,
                     'conversations': []
@@ -200,15 +316,24 @@ class SessionManager:
                 
                 # Use pipeline for atomic operations
                 pipe = client.pipeline()
-                pipe.set(session_key, self._serialize_data(session_data), ex=ttl)
+                pipe.hset(session_key, mapping=self._hash_fields(
+                    {k: v for k, v in session_data.items() if k != 'conversations'}))
+                pipe.expire(session_key, ttl)
                 pipe.expire(conversations_key, ttl)  # Initialize conversations list with TTL
                 
+                # Index by expiry time so cleanup only visits old sessions. Entries
+                # already past their expiry belong to sessions Redis has expired,
+                # so trim them here in case cleanup is never called
+                created_at = session_data['created_at']
+                pipe.zadd(self._session_index_key(), {session_id: created_at + ttl})
+                pipe.zremrangebyscore(self._session_index_key(), '-inf', created_at)
+                
                 # Update global stats
                 pipe.hincrby(self._stats_key(), 'total_sessions', 1)
                 
                 pipe.execute()
                 
-                logger.info(f"Initialized new session: {session_id} with TTL: {ttl}s")
+                logger.debug("Initialized new session: %s with TTL: %ss", session_id, ttl)
                 return session_data
                 
         except Exception as e:
@@ -218,14 +343,15 @@ class SessionManager:
     
     def _initialize_session_in_memory(self, session_id: str, session_start_time: str) -> dict:
         """Initialize a new session in memory."""
+        session_id = self._intern(session_id)
         if session_id in self.sessions:
-            logger.info(f"Session {session_id} already exists in memory, returning existing data")
+            logger.debug("Session %s already exists in memory, returning existing data", session_id)
             return self.sessions[session_id]
         
         session_data = {
             'session_id': session_id,
             'start_time': session_start_time,
-            'created_at': datetime.now().isoformat(),
+            'created_at': time.time(),
             'conversation_count': 0,
             'message_count': 0,
             'conversations': []
@@ -233,9 +359,41 @@ class SessionManager:
         
         self.sessions[session_id] = session_data
         self.stats['total_sessions'] += 1
-        logger.info(f"Initialized new session in memory: {session_id}")
+        if len(self.sessions) > MAX_SESSIONS_IN_MEMORY:
+            self._evict_oldest_session_in_memory()
+        logger.debug("Initialized new session in memory: %s", session_id)
         return session_data
     
+    def _evict_oldest_session_in_memory(self) -> None:
+        """Drop the oldest in-memory session and its conversations."""
+        _, session_data = self.sessions.popitem(last=False)
+        removed_conversations = 0
+        for conversation_id in session_data.get('conversations', []):
+            if self.conversations.pop(conversation_id, None) is not None:
+                removed_conversations += 1
+        self.stats['total_sessions'] -= 1
+        self.stats['total_conversations'] -= removed_conversations
+        self.stats['total_messages'] -= session_data.get('message_count', 0)
+    
+    def _evict_oldest_conversation_in_memory(self) -> None:
+        """Drop the oldest in-memory conversation and detach it from its session."""
+        conversation_id, conversation_data = self.conversations.popitem(last=False)
+        # Stats and session counts only track user/assistant pairs, not the
+        # system prompt a conversation may start with
+        message_count = conversation_data.get('message_count', 0)
+        counted_messages = message_count - message_count % 2
+        
+        session_data = self.sessions.get(conversation_data.get('session_id'))
+        if session_data is not None:
+            conversations = session_data.get('conversations', [])
+            if conversation_id in conversations:
+                conversations.remove(conversation_id)
+            # The session's own eviction or cleanup subtracts what is left
+            session_data['message_count'] = max(0, session_data.get('message_count', 0) - counted_messages)
+        
+        self.stats['total_conversations'] -= 1
+        self.stats['total_messages'] -= counted_messages
+    
     def initialize_conversation(self, 
                               conversation_id: str, 
                               conversation_start_time: str, 
@@ -263,15 +421,16 @@ class SessionManager:
         # Try Redis first, fall back to in-memory if it fails
         try:
             conversation_key = self._conversation_key(conversation_id)
+            messages_key = self._messages_key(conversation_id)
             session_key = self._session_key(session_id)
             conversations_key = self._session_conversations_key(session_id)
             ttl = ttl or self.default_conversation_ttl
             
             with self._get_redis_client() as client:
                 # Check if conversation already exists
-                if client.exists(conversation_key):
-                    existing_data = self._deserialize_data(client.get(conversation_key))
-                    logger.info(f"Conversation {conversation_id} already exists")
+                existing_data = self._load_conversation(client, conversation_id)
+                if existing_data:
+                    logger.debug("Conversation %s already exists", conversation_id)
                     return existing_data
                 
                 # Start with system message if provided
@@ -280,14 +439,14 @@ class SessionManager:
                     initial_messages.append({
                         'role': 'system',
                         'content': system_prompt,
-                        'timestamp': datetime.now().isoformat()
+                        'timestamp': time.time()
                     })
                 
                 conversation_data = {
                     'conversation_id': conversation_id,
                     'session_id': session_id,
                     'start_time': conversation_start_time,
-                    'created_at': datetime.now().isoformat(),
+                    'created_at': time.time(),
                     'messages': initial_messages,
                     'message_count': len(initial_messages)
                 }
@@ -296,25 +455,30 @@ class SessionManager:
                 pipe = client.pipeline()
                 
                 # Store conversation data
-                pipe.set(conversation_key, self._serialize_data(conversation_data), ex=ttl)
+                pipe.hset(conversation_key, mapping=self._hash_fields(
+                    {k: v for k, v in conversation_data.items() if k != 'messages'}))
+                pipe.expire(conversation_key, ttl)
+                if initial_messages:
+                    pipe.rpush(messages_key, *(self._serialize_data(m) for m in initial_messages))
+                    pipe.expire(messages_key, ttl)
                 
                 # Add conversation to session's conversation list
                 pipe.lpush(conversations_key, conversation_id)
                 pipe.expire(conversations_key, ttl)
                 
-                # Update session data
+                # Update session counter server-side
                 if client.exists(session_key):
-                    session_data = self._deserialize_data(client.get(session_key))
-                    session_data['conversation_count'] += 1
-                    session_data['conversations'].append(conversation_id)
-                    pipe.set(session_key, self._serialize_data(session_data), ex=ttl)
+                    pipe.hincrby(session_key, 'conversation_count', 1)
+                    pipe.expire(session_key, ttl)
+                    # Keep the index in step with the session's new expiry
+                    pipe.zadd(self._session_index_key(), {session_id: time.time() + ttl}, xx=True)
                 
                 # Update global stats
                 pipe.hincrby(self._stats_key(), 'total_conversations', 1)
                 
                 pipe.execute()
                 
-                logger.info(f"Initialized new conversation: {conversation_id} for session: {session_id}")
+                logger.debug("Initialized new conversation: %s for session: %s", conversation_id, session_id)
                 return conversation_data
                 
         except Exception as e:
@@ -329,25 +493,23 @@ class SessionManager:
                                         session_id: str,
                                         system_prompt: Optional[str] = None) -> dict:
         """Initialize a new conversation in memory."""
+        conversation_id = self._intern(conversation_id)
+        session_id = self._intern(session_id)
         if conversation_id in self.conversations:
-            logger.info(f"Conversation {conversation_id} already exists in memory, returning existing data")
-            return self.conversations[conversation_id]
+            logger.debug("Conversation %s already exists in memory, returning existing data", conversation_id)
+            return self._get_conversation_in_memory(conversation_id)
         
         # Start with system message if provided
         initial_messages = []
         if system_prompt:
-            initial_messages.append({
-                'role': 'system',
-                'content': system_prompt,
-                'timestamp': datetime.now().isoformat()
-            })
+            initial_messages.append(Message('system', system_prompt, time.time()))
         
         conversation_data = {
             'conversation_id': conversation_id,
             'session_id': session_id,
             'start_time': conversation_start_time,
-            'created_at': datetime.now().isoformat(),
-            'messages': initial_messages,
+            'created_at': time.time(),
+            'messages': deque(initial_messages, maxlen=MAX_MESSAGES_KEPT),
             'message_count': len(initial_messages)
         }
         
@@ -361,8 +523,12 @@ class SessionManager:
             self.sessions[session_id]['conversations'].append(conversation_id)
         
         self.stats['total_conversations'] += 1
-        logger.info(f"Initialized new conversation in memory: {conversation_id} for session: {session_id}")
-        return conversation_data
+        if len(self.conversations) > MAX_CONVERSATIONS_IN_MEMORY:
+            self._evict_oldest_conversation_in_memory()
+        logger.debug("Initialized new conversation in memory: %s for session: %s", conversation_id, session_id)
+        # A copy with dict messages, like the Redis path returns - callers
+        # must not be able to mutate the stored deque of Message tuples
+        return self._get_conversation_in_memory(conversation_id)
     
     def add_message_to_conversation(self, 
                                   conversation_id: str, 
@@ -386,52 +552,34 @@ class SessionManager:
         # Try Redis first, fall back to in-memory if it fails
         try:
             conversation_key = self._conversation_key(conversation_id)
+            messages_key = self._messages_key(conversation_id)
             session_key = self._session_key(session_id)
+            ttl = self.default_conversation_ttl
+            
+            # Add user message and assistant response
+            timestamp = time.time()
             
             with self._get_redis_client() as client:
-                conversation_data = self._deserialize_data(client.get(conversation_key))
+                # Append, trim and count atomically in one round trip. Active
+                # conversations stay alive; the list may be new if there was no
+                # system prompt, so it gets its TTL here either way
+                added = self._add_message_script(
+                    keys=[conversation_key, messages_key, session_key, self._stats_key()],
+                    args=[
+                        ttl,
+                        MAX_MESSAGES_KEPT,
+                        self._serialize_data({'role': 'user', 'content': message, 'timestamp': timestamp}),
+                        self._serialize_data({'role': 'assistant', 'content': response, 'timestamp': timestamp})
+                    ],
+                    client=client
+                )
                 
-                if not conversation_data:
+                if not added:
                     logger.warning(f"Conversation {conversation_id} not found in Redis, using in-memory fallback")
                     self._add_message_to_conversation_in_memory(conversation_id, message, response, session_id)
                     return
                 
-                # Add user message and assistant response
-                timestamp = datetime.now().isoformat()
-                
-                conversation_data['messages'].extend([
-                    {
-                        'role': 'user',
-                        'content': message,
-                        'timestamp': timestamp
-                    },
-                    {
-                        'role': 'assistant',
-                        'content': response,
-                        'timestamp': timestamp
-                    }
-                ])
-                
-                conversation_data['message_count'] += 2
-                
-                # Use pipeline for atomic operations
-                pipe = client.pipeline()
-                
-                # Update conversation (preserve existing TTL)
-                pipe.set(conversation_key, self._serialize_data(conversation_data), keepttl=True)
-                
-                # Update session message count
-                if client.exists(session_key):
-                    session_data = self._deserialize_data(client.get(session_key))
-                    session_data['message_count'] += 2
-                    pipe.set(session_key, self._serialize_data(session_data), keepttl=True)
-                
-                # Update global stats
-                pipe.hincrby(self._stats_key(), 'total_messages', 2)
-                
-                pipe.execute()
-                
-                logger.debug(f"Added message pair to conversation {conversation_id}")
+                logger.debug("Added message pair to conversation %s", conversation_id)
                 
         except Exception as e:
             logger.error(f"Redis error in add_message_to_conversation: {e}")
@@ -450,22 +598,14 @@ class SessionManager:
             self._initialize_conversation_in_memory(conversation_id, datetime.now().isoformat(), session_id)
         
         # Add user message and assistant response
-        timestamp = datetime.now().isoformat()
+        timestamp = time.time()
         
         if 'messages' not in self.conversations[conversation_id]:
-            self.conversations[conversation_id]['messages'] = []
+            self.conversations[conversation_id]['messages'] = deque(maxlen=MAX_MESSAGES_KEPT)
             
         self.conversations[conversation_id]['messages'].extend([
-            {
-                'role': 'user',
-                'content': message,
-                'timestamp': timestamp
-            },
-            {
-                'role': 'assistant',
-                'content': response,
-                'timestamp': timestamp
-            }
+            Message('user', message, timestamp),
+            Message('assistant', response, timestamp)
         ])
         
         if 'message_count' not in self.conversations[conversation_id]:
@@ -480,7 +620,7 @@ class SessionManager:
             self.sessions[session_id]['message_count'] += 2
         
         self.stats['total_messages'] += 2
-        logger.debug(f"Added message pair to conversation {conversation_id} in memory")
+        logger.debug("Added message pair to conversation %s in memory", conversation_id)
     
     def get_session(self, session_id: str) -> Optional[dict]:
         """
@@ -498,11 +638,8 @@ class SessionManager:
         
         # Try Redis first, fall back to in-memory if it fails
         try:
-            session_key = self._session_key(session_id)
-            
             with self._get_redis_client() as client:
-                session_data = client.get(session_key)
-                return self._deserialize_data(session_data) if session_data else None
+                return self._load_session(client, session_id)
                 
         except Exception as e:
             logger.error(f"Redis error in get_session: {e}")
@@ -521,20 +658,25 @@ class SessionManager:
         """
         # Use in-memory storage if Redis is not available
         if not hasattr(self, 'redis_pool') or not self.redis_available:
-            return self.conversations.get(conversation_id)
+            return self._get_conversation_in_memory(conversation_id)
         
         # Try Redis first, fall back to in-memory if it fails
         try:
-            conversation_key = self._conversation_key(conversation_id)
-            
             with self._get_redis_client() as client:
-                conversation_data = client.get(conversation_key)
-                return self._deserialize_data(conversation_data) if conversation_data else None
+                return self._load_conversation(client, conversation_id)
                 
         except Exception as e:
             logger.error(f"Redis error in get_conversation: {e}")
             self.redis_available = False  # Mark Redis as unavailable
-            return self.conversations.get(conversation_id)
+            return self._get_conversation_in_memory(conversation_id)
+    
+    def _get_conversation_in_memory(self, conversation_id: str) -> Optional[dict]:
+        """Get a copy of conversation data in memory, with messages as dicts."""
+        conversation_data = self.conversations.get(conversation_id)
+        if conversation_data is None:
+            return None
+        messages = conversation_data.get('messages', ())
+        return {**conversation_data, 'messages': [message._asdict() for message in messages]}
     
     def get_conversation_messages(self, conversation_id: str, limit: int = 10) -> List[dict]:
         """
@@ -547,10 +689,30 @@ class SessionManager:
         Returns:
             list: Recent messages
         """
-        conversation_data = self.get_conversation(conversation_id)
-        if conversation_data and 'messages' in conversation_data:
-            return conversation_data['messages'][-limit:]
-        return []
+        # Use in-memory storage if Redis is not available
+        if not hasattr(self, 'redis_pool') or not self.redis_available:
+            return self._get_conversation_messages_in_memory(conversation_id, limit)
+        
+        # Try Redis first, fall back to in-memory if it fails
+        try:
+            with self._get_redis_client() as client:
+                # Only the tail is read, not the whole history
+                messages = client.lrange(self._messages_key(conversation_id), -limit, -1)
+                return [self._deserialize_data(message) for message in messages]
+                
+        except Exception as e:
+            logger.error(f"Redis error in get_conversation_messages: {e}")
+            self.redis_available = False  # Mark Redis as unavailable
+            return self._get_conversation_messages_in_memory(conversation_id, limit)
+    
+    def _get_conversation_messages_in_memory(self, conversation_id: str, limit: int = 10) -> List[dict]:
+        """Get recent messages from a conversation in memory."""
+        conversation_data = self.conversations.get(conversation_id)
+        if not conversation_data or 'messages' not in conversation_data:
+            return []
+        # deques don't slice; islice walks only to the tail
+        messages = conversation_data['messages']
+        return [message._asdict() for message in islice(messages, max(0, len(messages) - limit), None)]
     
     def get_session_conversations(self, session_id: str) -> List[str]:
         """
@@ -627,39 +789,54 @@ class SessionManager:
         
         # Try Redis first, fall back to in-memory if it fails
         try:
-            cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
-            cutoff_timestamp = cutoff_time.isoformat()
-            
-            cleaned_count = 0
+            cutoff_epoch = time.time() - max_age_hours * 3600
+            index_key = self._session_index_key()
             
             with self._get_redis_client() as client:
-                # Use SCAN to iterate through session keys
-                session_pattern = f"{self.key_prefix}:session:*"
-                
-                for key in client.scan_iter(match=session_pattern):
-                    if not key.endswith(':conversations'):  # Skip conversation lists
-                        session_data = client.get(key)
-                        if session_data:
-                            data = self._deserialize_data(session_data)
-                            created_at = data.get('created_at', '')
-                            
-                            if created_at < cutoff_timestamp:
-                                session_id = data.get('session_id')
-                                if session_id:
-                                    # Delete session and its conversations
-                                    pipe = client.pipeline()
-                                    pipe.delete(key)  # Delete session
-                                    pipe.delete(self._session_conversations_key(session_id))
-                                    
-                                    # Delete associated conversations
-                                    for conv_id in data.get('conversations', []):
-                                        pipe.delete(self._conversation_key(conv_id))
-                                    
-                                    pipe.execute()
-                                    cleaned_count += 1
+                # The index holds expiry times. A session created before the
+                # cutoff with the default TTL expires before cutoff + TTL, so only
+                # those are candidates - no scan of the keyspace. Sessions whose
+                # TTL is longer (custom, or extended by a new conversation) are
+                # left for Redis to expire
+                candidates = client.zrangebyscore(index_key, '-inf', cutoff_epoch + self.default_session_ttl)
+                if not candidates:
+                    return 0
+                
+                # Fetch every candidate's creation time and conversation list in
+                # one round trip
+                pipe = client.pipeline(transaction=False)
+                for session_id in candidates:
+                    pipe.hget(self._session_key(session_id), 'created_at')
+                    pipe.lrange(self._session_conversations_key(session_id), 0, -1)
+                results = pipe.execute()
+                
+                # Sessions with a shorter TTL can be candidates while still inside
+                # the window; ones already expired by TTL have no creation time
+                expired, conversation_lists = [], []
+                for session_id, created_at, conversation_ids in zip(candidates, results[::2], results[1::2]):
+                    if created_at is None or float(created_at) < cutoff_epoch:
+                        expired.append(session_id)
+                        conversation_lists.append(conversation_ids)
+                if not expired:
+                    return 0
+                
+                # Delete sessions, their conversations and index entries together
+                pipe = client.pipeline()
+                session_deletes = []
+                for session_id, conversation_ids in zip(expired, conversation_lists):
+                    session_deletes.append(len(pipe))
+                    pipe.delete(self._session_key(session_id))
+                    pipe.delete(self._session_conversations_key(session_id))
+                    for conv_id in conversation_ids:
+                        pipe.delete(self._conversation_key(conv_id), self._messages_key(conv_id))
+                pipe.zrem(index_key, *expired)
+                results = pipe.execute()
+                
+                # Sessions Redis already expired by TTL only had an index entry left
+                cleaned_count = sum(results[i] for i in session_deletes)
             
             if cleaned_count > 0:
-                logger.info(f"Cleaned up {cleaned_count} old sessions")
+                logger.info("Cleaned up %s old sessions", cleaned_count)
             
             return cleaned_count
                 
@@ -670,34 +847,38 @@ class SessionManager:
     
     def _cleanup_old_sessions_in_memory(self, max_age_hours: int = 24) -> int:
         """Clean up old sessions in memory."""
-        cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
-        cutoff_timestamp = cutoff_time.isoformat()
+        cutoff_epoch = time.time() - max_age_hours * 3600
         
         sessions_to_remove = []
         conversations_to_remove = []
+        messages_removed = 0
         
+        # self.sessions is filled in creation order, so expired sessions form a
+        # prefix of it - stop at the first one still inside the window
         for session_id, session_data in self.sessions.items():
-            created_at = session_data.get('created_at', '')
-            
-            if created_at < cutoff_timestamp:
-                sessions_to_remove.append(session_id)
-                conversations_to_remove.extend(session_data.get('conversations', []))
+            if session_data.get('created_at', 0) >= cutoff_epoch:
+                break
+            sessions_to_remove.append(session_id)
+            conversations_to_remove.extend(session_data.get('conversations', []))
+            messages_removed += session_data.get('message_count', 0)
         
         # Remove sessions
         for session_id in sessions_to_remove:
             del self.sessions[session_id]
         
-        # Remove conversations
+        # Remove conversations - some may already have been evicted
+        conversations_removed = 0
         for conversation_id in conversations_to_remove:
-            if conversation_id in self.conversations:
-                del self.conversations[conversation_id]
+            if self.conversations.pop(conversation_id, None) is not None:
+                conversations_removed += 1
         
         # Update stats
         self.stats['total_sessions'] -= len(sessions_to_remove)
-        self.stats['total_conversations'] -= len(conversations_to_remove)
+        self.stats['total_conversations'] -= conversations_removed
+        self.stats['total_messages'] -= messages_removed
         
         if sessions_to_remove:
-            logger.info(f"Cleaned up {len(sessions_to_remove)} old sessions in memory")
+            logger.info("Cleaned up %s old sessions in memory", len(sessions_to_remove))
         
         return len(sessions_to_remove)
     
@@ -768,9 +949,9 @@ class SessionManager:
                     other_keys = []
                     
                     for key in all_keys:
-                        if ':session:' in key and not key.endswith(':conversations'):
+                        if ':sess:' in key and not key.endswith(':conversations'):
                             sessions.append(key)
-                        elif ':conversation:' in key:
+                        elif ':conv:' in key and not key.endswith(':messages'):
                             conversations.append(key)
                         else:
                             other_keys.append(key)
@@ -0,0 +1,55 @@
+"""
+Tests for RedCAPLogger's subprocess mode
+
+Run from the repository root with: python -m pytest tests
+"""
+
+import queue
+import sys
+import threading
+import time
+import types
+from unittest import mock
+
+import pytest
+
+from loggers.redcap_logger import RedCAPLogger, _subprocess_worker
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    """Secrets file with a REDCAP section, and a stand-in PyCap module"""
+    path = tmp_path / "secrets.toml"
+    path.write_text('[REDCAP]\nAPI_URL = "https://redcap.invalid/api/"\nAPI_TOKEN = "token"\n')
+    # PyCap is only used to validate the token when a worker connects
+    redcap = types.ModuleType("redcap")
+    redcap.Project = mock.Mock()
+    monkeypatch.setitem(sys.modules, "redcap", redcap)
+    return str(path)
+
+
+def test_stop_waits_for_batch_in_flight(config_path):
+    """Stopping the child while a batch is being posted still delivers it"""
+    sending = threading.Event()
+    delivered = []
+
+    def slow_post(logger, records, session):
+        sending.set()
+        time.sleep(0.5)
+        delivered.extend(records)
+        return {'count': len(records)}
+
+    # Run the child's entry point on a thread, fed the way the parent feeds it
+    mp_queue = queue.Queue()
+    with mock.patch.object(RedCAPLogger, '_post_records', slow_post):
+        child = threading.Thread(target=_subprocess_worker,
+                                 args=(mp_queue, config_path, {'max_wait': 0, 'workers': 1}))
+        child.start()
+        mp_queue.put(('session', 'conversation', 'hello', 'user', time.time()))
+        assert sending.wait(5), "batch was never sent"
+        # The batch has already left the shard, but its POST hasn't returned
+        mp_queue.put(None)
+        child.join(10)
+
+    assert not child.is_alive()
+    assert [record['message'] for record in delivered] == ['hello']